@@ -0,0 +1,207 @@
+"""
+This module hashes mod archives for createCustomIni's lockfile (--lock,
+--verify) and duplicate detection (--duplicates)
+
+Archives are read in fixed-size chunks into one reused buffer, so hashing a
+multi-gigabyte archive needs a single megabyte of memory. hashlib releases
+the GIL while it digests a chunk, so a thread pool keeps several drives (or
+one fast SSD) busy at once. Digests are cached keyed by each archive's size
+and mtime, so only new or touched archives are read again.
+
+Duplicates are found in stages that each read more of fewer files: archives
+are grouped by size (known from the scan, nothing is read), archives sharing
+a size by a hash of their first and last few KB, and only archives that
+still match are hashed in full. Almost every archive has a unique size, so
+most of them are never opened.
+"""
+
+import hashlib
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fileStore import load_cache, save_cache
+
+ALGORITHM = "sha256"
+CHUNK_SIZE = 1024 * 1024
+
+# Archives hashed at the same time; more threads mostly make disks seek
+HASH_WORKERS = 8
+
+HASH_CACHE_VERSION = 1
+
+# Bytes read from each end of an archive before it is hashed in full
+EDGE_SIZE = 16 * 1024
+
+FileHashes = namedtuple("FileHashes", ["digests", "errors", "hashed"])
+Duplicates = namedtuple("Duplicates", ["groups", "errors", "edges_read", "hashed"])
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Return the hex digest of a file, read chunk by chunk.
+    """
+    digest = hashlib.new(ALGORITHM)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+def _hash_file_record(path):
+    try:
+        return hash_file(path), None
+    except OSError as e:
+        return None, str(e)
+
+
+def hash_files(paths, cache_file=None, max_workers=None):
+    """
+    Hash many files across a thread pool. Digests are cached in cache_file
+    keyed by each file's size and mtime, so unchanged files are not read.
+    Returns FileHashes: digests and errors by absolute path, and how many
+    files were actually read.
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    state = load_cache(cache_file, HASH_CACHE_VERSION) if cache_file else None
+    cached = state["files"] if state else {}
+
+    digests = {}
+    errors = {}
+    stale = []
+    keys = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            errors[path] = str(e)
+            continue
+        key = (stat.st_size, stat.st_mtime_ns)
+        keys[path] = key
+        entry = cached.get(path)
+        if entry is not None and entry[0] == key:
+            digests[path] = entry[1]
+        else:
+            stale.append(path)
+
+    if stale:
+        workers = max_workers or min(HASH_WORKERS, len(stale))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, (digest, error) in zip(
+                stale, executor.map(_hash_file_record, stale)
+            ):
+                if error:
+                    errors[path] = error
+                else:
+                    digests[path] = digest
+
+        if cache_file:
+            # Callers may pass only some files of a folder (duplicate
+            # detection does), so only entries for deleted files are dropped
+            folders = {os.path.dirname(path) for path in paths}
+            files = {
+                path: entry
+                for path, entry in cached.items()
+                if path in keys
+                or os.path.dirname(path) not in folders
+                or os.path.exists(path)
+            }
+            files.update((path, (keys[path], digests[path])) for path in digests)
+            save_cache(cache_file, {"version": HASH_CACHE_VERSION, "files": files})
+
+    return FileHashes(digests, errors, len(stale))
+
+
+def hash_edges(path, size, edge_size=EDGE_SIZE):
+    """
+    Return the hex digest of the first and last edge_size bytes of a file
+    of the given size, which covers the whole file when it is small.
+    """
+    digest = hashlib.new(ALGORITHM)
+    with open(path, "rb") as f:
+        if size <= 2 * edge_size:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(edge_size))
+            f.seek(size - edge_size)
+            digest.update(f.read(edge_size))
+    return digest.hexdigest()
+
+
+def _hash_edges_record(item):
+    path, size = item
+    try:
+        return hash_edges(path, size), None
+    except OSError as e:
+        return None, str(e)
+
+
+def _regroup(groups, digests):
+    """
+    Split each group by digest, dropping files without one and groups that
+    end up with a single file. Keeps the order of the files within a group.
+    """
+    regrouped = []
+    for group in groups:
+        by_digest = {}
+        for item in group:
+            digest = digests.get(item[0])
+            if digest is not None:
+                by_digest.setdefault(digest, []).append(item)
+        regrouped.extend(g for g in by_digest.values() if len(g) > 1)
+    return regrouped
+
+
+def find_duplicates(files, cache_file=None, max_workers=None):
+    """
+    Find files with identical content among (path, size) pairs, where size
+    comes from the directory scan. Empty files are skipped, they are broken
+    archives rather than copies.
+    Returns Duplicates: lists of paths with the same content (in input
+    order), read errors by path, and how many files had their edges read
+    and how many were hashed in full.
+    """
+    by_size = {}
+    for path, size in files:
+        if size:
+            by_size.setdefault(size, []).append((os.path.abspath(path), size))
+    groups = [group for group in by_size.values() if len(group) > 1]
+    candidates = [item for group in groups for item in group]
+    if not candidates:
+        return Duplicates([], {}, 0, 0)
+
+    errors = {}
+    digests = {}
+    workers = max_workers or min(HASH_WORKERS, len(candidates))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (path, _), (digest, error) in zip(
+            candidates, executor.map(_hash_edges_record, candidates)
+        ):
+            if error:
+                errors[path] = error
+            else:
+                digests[path] = digest
+    groups = _regroup(groups, digests)
+
+    # Small files were read whole already, only larger ones need a full hash
+    large = [path for group in groups for path, size in group if size > 2 * EDGE_SIZE]
+    full = hash_files(large, cache_file, max_workers) if large else None
+    if full is not None:
+        errors.update(full.errors)
+        digests.update(full.digests)
+        # An edge digest alone does not prove two archives are the same
+        for path in full.errors:
+            digests.pop(path, None)
+        groups = _regroup(groups, digests)
+
+    return Duplicates(
+        [[path for path, _ in group] for group in groups],
+        errors,
+        len(candidates),
+        full.hashed if full is not None else 0,
+    )
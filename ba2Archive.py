@@ -0,0 +1,296 @@
+"""
+This module reads Bethesda Archive 2 (.ba2) files for createCustomIni
+
+Archives are memory mapped and parsed in place. Checking an archive only
+touches its fixed header, a few dozen bytes no matter how large it is, and
+the cross-archive file index only touches the name tables.
+"""
+
+import mmap
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fileStore import load_cache, save_cache
+
+BA2_MAGIC = b"BTDX"
+
+# magic, version, archive type, file count, name table offset
+HEADER = struct.Struct("<4sI4sIQ")
+NAME_LENGTH = struct.Struct("<H")
+
+# Versions 2 and 3 (Starfield) add fields after the common header
+HEADER_SIZES = {1: 24, 2: 32, 3: 36, 7: 24, 8: 24}
+
+# Smallest file record for each archive type, used to spot truncated archives
+FILE_RECORD_SIZES = {"GNRL": 36, "DX10": 24}
+
+# Where an archive that is not in the catalog most likely belongs
+SUGGESTED_SECTIONS = {
+    "DX10": "sResourceIndexFileList",
+    "GNRL": "sResourceArchive2List",
+}
+
+INDEX_CACHE_VERSION = 1
+
+Ba2Header = namedtuple(
+    "Ba2Header",
+    [
+        "path",
+        "version",
+        "archive_type",
+        "file_count",
+        "name_table_offset",
+        "size",
+        "error",
+    ],
+)
+
+
+class Ba2Error(ValueError):
+    """
+    Raised when a file is not a valid BA2 archive.
+    """
+
+
+def parse_header(buffer, size):
+    """
+    Parse and check the header at the start of buffer, where size is the
+    size of the whole archive. Returns (version, archive type, file count,
+    name table offset) or raises Ba2Error.
+    """
+    if size < HEADER.size:
+        raise Ba2Error(f"truncated header ({size} bytes)")
+
+    magic, version, archive_type, file_count, name_table_offset = HEADER.unpack_from(
+        buffer, 0
+    )
+    if magic != BA2_MAGIC:
+        raise Ba2Error("not a BA2 archive (bad magic)")
+    if version not in HEADER_SIZES:
+        raise Ba2Error(f"unsupported version {version}")
+
+    archive_type = archive_type.decode("ascii", "replace")
+    if archive_type not in FILE_RECORD_SIZES:
+        raise Ba2Error(f"unknown archive type '{archive_type}'")
+
+    records_end = HEADER_SIZES[version] + file_count * FILE_RECORD_SIZES[archive_type]
+    if records_end > size:
+        raise Ba2Error(f"truncated file table ({file_count} files in {size} bytes)")
+    if name_table_offset and not records_end <= name_table_offset <= size:
+        raise Ba2Error(f"name table offset {name_table_offset} is out of range")
+
+    return version, archive_type, file_count, name_table_offset
+
+
+def read_header(path):
+    """
+    Read the header of one archive through a read-only memory map.
+    Returns a Ba2Header, raises Ba2Error for invalid archives.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            # Empty files can't be mapped
+            raise Ba2Error(f"truncated header ({size} bytes)")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            fields = parse_header(mapped, size)
+    return Ba2Header(path, *fields, size, None)
+
+
+def _read_header_record(path):
+    try:
+        return read_header(path)
+    except (OSError, Ba2Error) as e:
+        return Ba2Header(path, None, None, None, None, None, str(e))
+
+
+def read_headers(paths, max_workers=None):
+    """
+    Read the headers of many archives across a thread pool.
+    Returns one Ba2Header per path in the same order, invalid archives get
+    a record with error set instead of raising.
+    """
+    paths = list(paths)
+    if not paths:
+        return []
+    if max_workers is None:
+        max_workers = min(32, len(paths))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_read_header_record, paths))
+
+
+def suggest_section(header):
+    """
+    Suggest an ini section for an archive from its type: texture archives
+    (DX10) go in sResourceIndexFileList, general ones in sResourceArchive2List.
+    """
+    if header.error:
+        return None
+    return SUGGESTED_SECTIONS.get(header.archive_type)
+
+
+def read_name_table(path):
+    """
+    Read the internal file paths of an archive from its name table.
+    Each entry is a uint16 length followed by the path; the names are decoded
+    straight out of the memory map without copying the table first.
+    Paths are lower-cased with forward slashes, the way the game looks them up.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise Ba2Error(f"truncated header ({size} bytes)")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            _, _, file_count, offset = parse_header(mapped, size)
+            if not offset:
+                return ()
+            view = memoryview(mapped)
+            try:
+                names = []
+                for _ in range(file_count):
+                    if offset + 2 > size:
+                        raise Ba2Error("truncated name table")
+                    (length,) = NAME_LENGTH.unpack_from(view, offset)
+                    offset += 2
+                    if offset + length > size:
+                        raise Ba2Error("truncated name table")
+                    name = str(view[offset : offset + length], "cp1252", "replace")
+                    names.append(name.replace("\\", "/").lower())
+                    offset += length
+            finally:
+                view.release()
+    return tuple(names)
+
+
+def _read_name_table_record(path):
+    try:
+        return read_name_table(path), None
+    except (OSError, Ba2Error) as e:
+        return (), str(e)
+
+
+def build_file_index(paths, cache_file=None, max_workers=None):
+    """
+    Build an index from internal asset path to the archives that contain it.
+    paths must be in load order; an asset in more than one archive is won by
+    the archive loaded last. Name tables are cached in cache_file keyed by
+    each archive's size and mtime, so only new or changed archives are parsed.
+    Returns a FileIndex.
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    state = load_cache(cache_file, INDEX_CACHE_VERSION) if cache_file else None
+    cached = state["archives"] if state else {}
+
+    tables = {}
+    errors = {}
+    stale = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            errors[path] = str(e)
+            continue
+        key = (stat.st_size, stat.st_mtime_ns)
+        entry = cached.get(path)
+        if entry is not None and entry[0] == key:
+            tables[path] = (key, entry[1])
+        else:
+            stale.append((path, key))
+
+    if stale:
+        workers = max_workers or min(32, len(stale))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_read_name_table_record, [p for p, _ in stale])
+            for (path, key), (names, error) in zip(stale, results):
+                if error:
+                    errors[path] = error
+                else:
+                    tables[path] = (key, names)
+
+        if cache_file:
+            # Keep entries for other data folders, replace the ones scanned now
+            folders = {os.path.dirname(path) for path in paths}
+            archives = {
+                path: entry
+                for path, entry in cached.items()
+                if os.path.dirname(path) not in folders
+            }
+            archives.update(tables)
+            save_cache(
+                cache_file, {"version": INDEX_CACHE_VERSION, "archives": archives}
+            )
+
+    # The first archive holding an asset goes in owners, any later ones make
+    # it a conflict; most assets live in a single archive
+    owners = {}
+    conflicts = {}
+    file_count = 0
+    for archive_index, path in enumerate(paths):
+        if path not in tables:
+            continue
+        names = tables[path][1]
+        file_count += len(names)
+        for name in names:
+            owner = owners.setdefault(name, archive_index)
+            if owner != archive_index:
+                conflicts.setdefault(name, [owner]).append(archive_index)
+
+    archives = tuple(os.path.basename(path) for path in paths)
+    return FileIndex(archives, owners, conflicts, file_count, errors)
+
+
+class FileIndex:
+    """
+    Asset path to archive index for a set of archives in load order.
+    """
+
+    def __init__(self, archives, owners, conflicts, file_count, errors):
+        self.archives = archives
+        self.owners = owners
+        self.conflicts = conflicts
+        self.file_count = file_count
+        self.errors = errors
+
+    def archives_for(self, asset):
+        """
+        Names of the archives that contain asset, in load order.
+        """
+        asset = asset.replace("\\", "/").lower()
+        if asset in self.conflicts:
+            return [self.archives[index] for index in self.conflicts[asset]]
+        if asset in self.owners:
+            return [self.archives[self.owners[asset]]]
+        return []
+
+    def iter_conflicts(self):
+        """
+        Yield (asset, winning archive, overridden archives) for every asset
+        found in more than one archive.
+        """
+        for asset, indexes in self.conflicts.items():
+            yield (
+                asset,
+                self.archives[indexes[-1]],
+                [self.archives[index] for index in indexes[:-1]],
+            )
+
+    def conflict_summary(self):
+        """
+        Count overridden assets per (winner, loser) pair of archives.
+        Returns a list of (winner, loser, count), largest first.
+        """
+        counts = {}
+        for indexes in self.conflicts.values():
+            winner = indexes[-1]
+            for loser in indexes[:-1]:
+                if loser != winner:
+                    counts[winner, loser] = counts.get((winner, loser), 0) + 1
+        return sorted(
+            (
+                (self.archives[winner], self.archives[loser], count)
+                for (winner, loser), count in counts.items()
+            ),
+            key=lambda item: -item[2],
+        )
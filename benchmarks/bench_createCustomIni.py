@@ -0,0 +1,250 @@
+"""
+Benchmarks for the createCustomIni pipeline
+
+Builds synthetic Data folders of several sizes and times each stage on its own:
+directory detection, scan, classification, rendering and writing, plus the GUI's
+_scan_mods_thread path run headless. Results are written as JSON and compared
+against a stored baseline; the run fails when a stage got slower than the
+allowed threshold.
+
+    py benchmarks/bench_createCustomIni.py --save-baseline
+    py benchmarks/bench_createCustomIni.py --output bench_output.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import createCustomIni  # noqa: E402
+
+DEFAULT_SIZES = [10, 1000, 50000]
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+STAGES = ["detect", "scan", "classify", "render", "write", "gui_scan", "gui_reuse"]
+
+
+def make_data_folder(folder, archives, loose=0, official=0):
+    """
+    Fill folder with empty .ba2 archives, some of them named after catalog
+    entries, plus loose files and official SeventySix archives to skip.
+    """
+    catalog = createCustomIni.get_catalog()
+    known = [mod for section in catalog.sections for mod in section.mods]
+    names = known[: min(len(known), archives // 10)]
+    names += [f"SyntheticMod{index:06d}.ba2" for index in range(archives - len(names))]
+    names += [f"SeventySix - Synthetic{index:04d}.ba2" for index in range(official)]
+    names += [f"loose{index:06d}.txt" for index in range(loose)]
+    for name in names:
+        open(os.path.join(folder, name), "wb").close()
+
+
+def best_of(repeat, func):
+    """
+    Run func repeat times, returning the fastest time and the last result.
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def gui_scan(folder, reuse=False):
+    """
+    Time CreateCustomIniGUI._scan_mods_thread without a window, rescanning
+    every time or (reuse) going through the GUI's scan cache. Returns None
+    when the GUI module can't be imported here.
+    """
+    try:
+        from createCustomIniGUI import CreateCustomIniGUI
+    except Exception:
+        return None
+
+    stub = SimpleNamespace(
+        scan_results=SimpleNamespace(put=lambda result: None),
+        scan_cache={},
+    )
+    if reuse:
+        stub.get_scan = lambda mods_dir, **kwargs: CreateCustomIniGUI.get_scan(
+            stub, mods_dir, **kwargs
+        )
+        stub.get_scan(folder)
+    else:
+        stub.get_scan = lambda mods_dir, **kwargs: (
+            createCustomIni.scan_data_folder(mods_dir, **kwargs),
+            False,
+        )
+    cancel = threading.Event()
+    return lambda: CreateCustomIniGUI._scan_mods_thread(stub, folder, cancel)
+
+
+def bench_size(size, repeat, loose, official):
+    """
+    Time every stage for a synthetic folder with size archives.
+    """
+    work_dir = tempfile.mkdtemp(prefix="createCustomIni_bench_")
+    try:
+        data_dir = os.path.join(work_dir, "Data")
+        os.mkdir(data_dir)
+        make_data_folder(data_dir, size, loose, official)
+        ini_file_path = os.path.join(work_dir, "out", createCustomIni.FILENAME)
+        catalog = createCustomIni.get_catalog()
+
+        timings = {}
+        timings["detect"], _ = best_of(
+            repeat, createCustomIni.find_fallout76_directory
+        )
+        timings["scan"], scan = best_of(
+            repeat, lambda: createCustomIni.scan_data_folder(data_dir)
+        )
+        archives = scan.archives
+        timings["classify"], classification = best_of(
+            repeat, lambda: createCustomIni.classify_mods(archives, catalog.classifier)
+        )
+        timings["render"], content = best_of(
+            repeat, lambda: createCustomIni.render_ini(classification)
+        )
+
+        def write():
+            # Always measure a real write, not the unchanged-file shortcut
+            if os.path.exists(ini_file_path):
+                os.remove(ini_file_path)
+            return createCustomIni.write_ini(ini_file_path, content)
+
+        timings["write"], _ = best_of(repeat, write)
+
+        for stage, reuse in (("gui_scan", False), ("gui_reuse", True)):
+            gui = gui_scan(data_dir, reuse)
+            if gui is not None:
+                timings[stage], _ = best_of(repeat, gui)
+        return timings
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    Return a message for every stage that is more than threshold times slower
+    than the baseline (and slower by at least min_delta seconds, to ignore
+    noise on stages that take microseconds).
+    """
+    regressions = []
+    for size, timings in results["results"].items():
+        base_timings = baseline.get("results", {}).get(size, {})
+        for stage, elapsed in timings.items():
+            base = base_timings.get(stage)
+            if base is None:
+                continue
+            if elapsed > base * threshold and elapsed - base > min_delta:
+                regressions.append(
+                    f"{size} archives, {stage}: {elapsed * 1000:.2f} ms "
+                    f"vs baseline {base * 1000:.2f} ms ({elapsed / base:.2f}x)"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the createCustomIni pipeline"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Number of .ba2 archives in each synthetic data folder "
+        "(Default: {})".format(" ".join(map(str, DEFAULT_SIZES))),
+    )
+    parser.add_argument(
+        "--loose", type=int, default=0, help="Loose files added to each data folder"
+    )
+    parser.add_argument(
+        "--official",
+        type=int,
+        default=0,
+        help="SeventySix archives added to each data folder",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per stage, the best one counts"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="Baseline JSON file to compare against "
+        "(Default: benchmarks/baseline.json)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store these results as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Fail when a stage is this many times slower than the baseline "
+        "(Default: 1.5)",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.002,
+        help="Ignore slowdowns smaller than this many seconds (Default: 0.002)",
+    )
+    args = parser.parse_args(argv)
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "loose": args.loose,
+        "official": args.official,
+        "results": {},
+    }
+    for size in args.sizes:
+        timings = bench_size(size, args.repeat, args.loose, args.official)
+        results["results"][str(size)] = timings
+        print(f"{size} archives:")
+        for stage in STAGES:
+            if stage in timings:
+                print(f"  {stage:<10} {timings[stage] * 1000:10.3f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for message in regressions:
+        print(f"Regression: {message}")
+    if regressions:
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
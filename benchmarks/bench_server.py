@@ -0,0 +1,146 @@
+"""
+Latency of the --serve JSON-RPC mode against the one-shot command line
+
+Builds a synthetic Data folder, then times generating the ini by running
+createCustomIni.py once per call (interpreter startup, detection, catalog
+and scan every time) and by calling "generate" on a running server.
+
+    py benchmarks/bench_server.py
+    py benchmarks/bench_server.py --archives 5000 --calls 50 --output server.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import rpcServer  # noqa: E402
+from bench_createCustomIni import make_data_folder  # noqa: E402
+
+SCRIPT = os.path.join(ROOT_DIR, "createCustomIni.py")
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "calls": len(samples),
+        "median": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min": samples[0],
+    }
+
+
+def time_calls(calls, func):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def start_server(data_dir, ini_folder):
+    """
+    Start --serve on a free port, returns (process, url).
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            SCRIPT,
+            "--datafolder",
+            data_dir,
+            "--inifolder",
+            ini_folder,
+            "--serve",
+            "--port",
+            "0",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    if not line.startswith("Serving on"):
+        process.kill()
+        raise RuntimeError(f"Server did not start: {line!r}")
+    return process, line.split()[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark --serve against the one-shot command line"
+    )
+    parser.add_argument(
+        "--archives", type=int, default=1000, help="Archives in the data folder"
+    )
+    parser.add_argument(
+        "--loose", type=int, default=0, help="Loose files added to the data folder"
+    )
+    parser.add_argument(
+        "--calls", type=int, default=20, help="Generate calls timed for each mode"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="createCustomIni_bench_")
+    try:
+        data_dir = os.path.join(work_dir, "Data")
+        ini_folder = os.path.join(work_dir, "out")
+        os.mkdir(data_dir)
+        make_data_folder(data_dir, args.archives, args.loose)
+
+        command = [
+            sys.executable,
+            SCRIPT,
+            "--datafolder",
+            data_dir,
+            "--inifolder",
+            ini_folder,
+        ]
+        cli = time_calls(
+            args.calls,
+            lambda: subprocess.run(command, stdout=subprocess.DEVNULL, check=True),
+        )
+
+        process, url = start_server(data_dir, ini_folder)
+        try:
+            # The first call fills the scan cache, like the first install would
+            rpcServer.call(url, "generate")
+            rpc = time_calls(args.calls, lambda: rpcServer.call(url, "generate"))
+            rpcServer.call(url, "shutdown")
+            process.wait(timeout=10)
+        finally:
+            if process.poll() is None:
+                process.kill()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "archives": args.archives,
+        "loose": args.loose,
+        "cli": summarize(cli),
+        "rpc": summarize(rpc),
+    }
+    for mode in ("cli", "rpc"):
+        summary = results[mode]
+        print(
+            f"{mode:<4} median {summary['median'] * 1000:8.2f} ms"
+            f"  p95 {summary['p95'] * 1000:8.2f} ms"
+        )
+    speedup = results["cli"]["median"] / results["rpc"]["median"]
+    print(f"--serve is {speedup:.0f}x faster")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,241 @@
 """
 This module creates a fallout76Custom.ini file from the installed mods in the data directory
+
+It can also be imported without side effects. The work is split into stages that
+return plain result objects, so the GUI and other tools can run them in-process:
+
+    scan = scan_data_folder(data_dir)
+    classification = classify_mods(scan.archives)
+    content = render_ini(classification)
+    write_ini(ini_file_path, content, import_ini)
+
+generate_ini() runs all of the stages in order.
 """
 
 import argparse
 import ctypes
+import fnmatch
+import hashlib
+import json
 import os
+import re
 import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from fileStore import file_matches, load_cache, replace_file, save_cache
 
 # Set the default filename
 FILENAME = "Fallout76Custom.ini"
 
+# The catalog of mods that should go in specific lists lives in
+# CATALOG_FILE, all other mods go in the default section
+# (sResourceArchive2List). Users can layer their own placements on top in
+# USER_CATALOG_FILE or with --catalog. Both are looked up next to this
+# script, next to the exe in a PyInstaller build (where __file__ is in the
+# extraction folder). The exe also carries its own copy of CATALOG_FILE
+# (--add-data), used when there is none next to it.
+if getattr(sys, "frozen", False):
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(sys.executable))
+else:
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLE_DIR = getattr(sys, "_MEIPASS", SCRIPT_DIR)
+CATALOG_FILE = "createCustomIni_catalog.json"
+USER_CATALOG_FILE = "createCustomIni_catalog.user.json"
+CATALOG_CACHE_FILE = "createCustomIni_catalog.cache"
+CATALOG_CACHE_VERSION = 1
+
+# Cached BA2 name tables for --conflicts
+INDEX_CACHE_FILE = "createCustomIni_index.cache"
+
+# The last scan is saved next to the ini for --if-changed
+SNAPSHOT_SUFFIX = ".snapshot.json"
+SNAPSHOT_VERSION = 1
+
+# The archive set of an ini is recorded next to it for --lock and --verify,
+# archive hashes are cached by size and mtime
+LOCK_SUFFIX = ".lock.json"
+LOCK_VERSION = 1
+HASH_CACHE_FILE = "createCustomIni_hashes.cache"
+
+# Imported ini files are merged into this section of the generated ini
+ARCHIVE_SECTION = b"archive"
+UTF8_BOM = b"\xef\xbb\xbf"
+
+# Scans call their progress callback at most this often (seconds), and look
+# at the clock and the cancel token once per this many folder entries
+PROGRESS_INTERVAL = 0.1
+SCAN_CHECK_EVERY = 256
+
+# Recursive scans (--recursive): default depth limit and folders listed at once
+DEFAULT_MAX_DEPTH = 4
+WALK_WORKERS = 8
+
+# Installs generated at the same time in --fleet mode
+FLEET_WORKERS = 8
+
+# --budget limits per section: archive bytes and files inside the archives.
+# Everything in the startup list is loaded before the main menu.
+BUDGET_UNITS = {"kb": 1024, "mb": 1024**2, "gb": 1024**3, "files": 1}
+DEFAULT_BUDGET_LIMITS = {"sResourceStartUpArchiveList": {"size": 512 * 1024**2}}
+
+# Result objects returned by the pipeline stages, ArchiveEntry.mtime is st_mtime_ns
+ArchiveEntry = namedtuple("ArchiveEntry", ["name", "size", "mtime", "is_file"])
+WalkOptions = namedtuple("WalkOptions", ["max_depth", "exclude"])
+
+
+class ScanResult(
+    namedtuple(
+        "ScanResult", ["data_dir", "dir_mtime", "entries", "subdirs"], defaults=((),)
+    )
+):
+    """
+    The mod archives found in a data folder, as ArchiveEntry records
+    in directory order. dir_mtime is taken before the folder is read.
+    Recursive scans name archives by their relative path with forward
+    slashes and list every subfolder they read in subdirs as
+    (relative path, mtime).
+    """
+
+    __slots__ = ()
+
+    @property
+    def archives(self):
+        return tuple(entry.name for entry in self.entries)
 
-def find_fallout76_directory():
+
+class SectionMods(
+    namedtuple("SectionMods", ["filename", "default_mods", "known_mods", "other_mods"])
+):
+    """
+    The mods found for one section. known_mods are listed in the catalog and
+    are kept in catalog order, other_mods are in scan order.
+    """
+
+    __slots__ = ()
+
+    @property
+    def found_mods(self):
+        return self.known_mods + self.other_mods
+
+
+Classification = namedtuple("Classification", ["sections", "total", "place_last"])
+WriteResult = namedtuple(
+    "WriteResult", ["path", "bytes_written", "imported", "changed"]
+)
+GenerateResult = namedtuple("GenerateResult", ["scan", "classification", "write"])
+IniIndex = namedtuple("IniIndex", ["sections", "keys"])
+Profile = namedtuple("Profile", ["name", "output", "include", "exclude", "import_ini"])
+ProfileResult = namedtuple(
+    "ProfileResult", ["profile", "classification", "write", "error"]
+)
+Install = namedtuple(
+    "Install", ["name", "data_dir", "ini_file", "import_ini", "update"]
+)
+InstallResult = namedtuple(
+    "InstallResult", ["install", "classification", "write", "error", "trace"]
+)
+Drift = namedtuple("Drift", ["kind", "name", "detail"])
+SectionBudget = namedtuple(
+    "SectionBudget", ["filename", "archives", "size", "file_count", "over"]
+)
+
+
+class Trace:
+    """
+    Per-phase wall-clock timers and counters for one run, for --timings,
+    --trace-file and the GUI log. Code that is not being traced gets
+    NULL_TRACE, whose methods do nothing.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.phases = []
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_scan(self, scan):
+        self.count("archives_matched", len(scan.entries))
+
+    def record_classification(self, classification):
+        for section in classification.sections:
+            self.count(f"section.{section.filename}", len(section.found_mods))
+
+    def record_write(self, write):
+        self.count("bytes_written", write.bytes_written)
+        self.count("import_used", 1 if write.imported else 0)
+
+    def to_dict(self):
+        return {
+            "phases": [{"name": name, "seconds": secs} for name, secs in self.phases],
+            "total_seconds": sum(secs for _, secs in self.phases),
+            "counters": dict(self.counters),
+        }
+
+    def report(self):
+        """
+        Return the timings and counters as printable lines.
+        """
+        lines = ["Timings:"]
+        for name, secs in self.phases:
+            lines.append(f"  {name:<28} {secs * 1000:10.2f} ms")
+        total = sum(secs for _, secs in self.phases)
+        lines.append(f"  {'total':<28} {total * 1000:10.2f} ms")
+        lines.append("Counters:")
+        for name, value in self.counters.items():
+            lines.append(f"  {name:<28} {value:10}")
+        return lines
+
+    def save(self, trace_file):
+        with open(trace_file, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class _NullTrace(Trace):
+    """
+    A Trace that records nothing.
+    """
+
+    enabled = False
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def count(self, name, value=1):
+        pass
+
+    def record_scan(self, scan):
+        pass
+
+    def record_classification(self, classification):
+        pass
+
+    def record_write(self, write):
+        pass
+
+
+_NULL_PHASE = nullcontext()
+NULL_TRACE = _NullTrace()
+
+
+def find_fallout76_directory(log=None):
     """
     Find the Fallout 76 directory by checking multiple possible locations.
     Returns the path if found, otherwise returns the default path.
+    Pass a callable as log (e.g. print) to report which directory was used.
     """
     user_home = os.path.expanduser("~")
 
@@ -39,224 +260,2276 @@ def find_fallout76_directory():
     # Check each possible path
     for path in possible_paths:
         if os.path.exists(path):
-            print(f"Found Fallout 76 directory at: {path}")
+            if log:
+                log(f"Found Fallout 76 directory at: {path}")
             return path
 
     # If none found, return the standard path (will be created if needed)
     default_path = os.path.join(user_home, "Documents", "My Games", "Fallout 76")
-    print(f"Using default Fallout 76 directory: {default_path}")
+    if log:
+        log(f"Using default Fallout 76 directory: {default_path}")
     return default_path
 
 
-# Set the default home directory using the finder function
-HOME_DIR = find_fallout76_directory()
+def is_mod_archive(file):
+    """
+    Make sure the file is not an official file (starts with "SeventySix")
+    and is a ba2 (file extension)
+    """
+    return not file.startswith("SeventySix") and file.lower().endswith(".ba2")
 
-# Get arguments from the user
-parser = argparse.ArgumentParser(
-    description="This program will automatically create the "
-    "Fallout76Custom.ini file for you. In most cases the "
-    "default arguments will be fine."
-)
-parser.add_argument(
-    "--datafolder",
-    default=".",
-    help="Specify Fallout 76's data folder location (Default: current directory)",
-)
-parser.add_argument(
-    "--inifolder",
-    default=HOME_DIR,
-    help="Specify the folder where Fallout76Custom.ini lives (Default: {})".format(
-        HOME_DIR
-    ),
-)
-parser.add_argument(
-    "--inifilename",
-    default=FILENAME,
-    help="Specify the filename for the ini (Default: {})".format(FILENAME),
-)
-parser.add_argument(
-    "--runasadmin",
-    action="store_true",
-    help="Runs as an admin. Use when Fallout 76 is installed in UAC location.",
-)
-parser.add_argument(
-    "--copyinicontents", help="Copy a file's contents into your custom .ini"
+
+class ScanCancelled(Exception):
+    """
+    Raised by a scan whose cancel token was set.
+    """
+
+
+def iter_archives(mods_dir, trace=NULL_TRACE, cancel=None, progress=None):
+    """
+    Yield an ArchiveEntry for every mod archive directly inside mods_dir.
+    Names are filtered before anything is stat'ed, and the stat comes from
+    the cached DirEntry data where the OS already returned it (Windows).
+    cancel is a threading.Event (or anything with is_set()); once it is set
+    the scan stops with ScanCancelled. progress(entries_seen, archives_found)
+    is called at most every PROGRESS_INTERVAL seconds and once at the end.
+    """
+    seen = 0
+    found = 0
+    next_report = time.monotonic() + PROGRESS_INTERVAL
+    with os.scandir(mods_dir) as entries:
+        for entry in entries:
+            seen += 1
+            if seen % SCAN_CHECK_EVERY == 0:
+                if cancel is not None and cancel.is_set():
+                    raise ScanCancelled(mods_dir)
+                if progress is not None and time.monotonic() >= next_report:
+                    progress(seen, found)
+                    next_report = time.monotonic() + PROGRESS_INTERVAL
+            if not is_mod_archive(entry.name):
+                continue
+            try:
+                if entry.is_dir():
+                    continue
+                stat = entry.stat()
+                archive = ArchiveEntry(
+                    entry.name, stat.st_size, stat.st_mtime_ns, entry.is_file()
+                )
+            except OSError:
+                # Broken links are still listed, the same way os.walk lists them
+                archive = ArchiveEntry(entry.name, 0, 0, False)
+            found += 1
+            yield archive
+    if cancel is not None and cancel.is_set():
+        raise ScanCancelled(mods_dir)
+    if progress is not None:
+        progress(seen, found)
+    trace.count("entries_seen", seen)
+
+
+def _list_directory(path, rel, exclude):
+    """
+    List one folder for iter_archives_recursive(). Returns (archives,
+    subdirs, seen), subdirs holds (path, relative path, identity, mtime)
+    for every subfolder that is not excluded. Linked folders are followed.
+    """
+    archives = []
+    subdirs = []
+    seen = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            seen += 1
+            name = rel + entry.name
+            if exclude is not None and (
+                exclude.match(name) or exclude.match(entry.name)
+            ):
+                continue
+            try:
+                if entry.is_dir():
+                    # DirEntry.stat() has no inode on Windows, os.stat() does
+                    stat = os.stat(entry.path)
+                    subdirs.append(
+                        (
+                            entry.path,
+                            name + "/",
+                            (stat.st_dev, stat.st_ino),
+                            stat.st_mtime_ns,
+                        )
+                    )
+                    continue
+            except OSError:
+                continue
+            if not is_mod_archive(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+                archives.append(
+                    ArchiveEntry(name, stat.st_size, stat.st_mtime_ns, entry.is_file())
+                )
+            except OSError:
+                archives.append(ArchiveEntry(name, 0, 0, False))
+    return archives, subdirs, seen
+
+
+def iter_archives_recursive(
+    mods_dir,
+    walk,
+    trace=NULL_TRACE,
+    cancel=None,
+    progress=None,
+    subdirs=None,
+    max_workers=WALK_WORKERS,
+):
+    """
+    Yield an ArchiveEntry for every mod archive in mods_dir and its
+    subfolders, down to walk.max_depth levels. Names are relative paths with
+    forward slashes. Folders are listed on a thread pool while the results
+    of earlier ones are yielded, in a stable order: breadth first, each
+    folder's subfolders in the order they were listed. Paths matching a
+    walk.exclude glob (by relative path or by name) are skipped, and a
+    folder reached twice through links is only read once. When subdirs is a
+    list, (relative path, mtime) of every folder read below mods_dir is
+    appended to it. cancel and progress work as for iter_archives().
+    """
+    exclude = _compile_globs(walk.exclude)
+    root = os.stat(mods_dir)
+    visited = {(root.st_dev, root.st_ino)}
+    seen = 0
+    found = 0
+    next_report = time.monotonic() + PROGRESS_INTERVAL
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque([(executor.submit(_list_directory, mods_dir, "", exclude), 0)])
+        try:
+            while pending:
+                future, depth = pending.popleft()
+                try:
+                    archives, children, listed = future.result()
+                except OSError:
+                    if depth == 0:
+                        raise
+                    trace.count("folders_unreadable")
+                    continue
+                if cancel is not None and cancel.is_set():
+                    raise ScanCancelled(mods_dir)
+                seen += listed
+                if depth < walk.max_depth:
+                    for path, rel, identity, mtime in children:
+                        # Some network filesystems report no inode numbers,
+                        # there only the depth limit stops link loops
+                        if identity[1]:
+                            if identity in visited:
+                                continue
+                            visited.add(identity)
+                        if subdirs is not None:
+                            subdirs.append((rel[:-1], mtime))
+                        future = executor.submit(_list_directory, path, rel, exclude)
+                        pending.append((future, depth + 1))
+                for archive in archives:
+                    found += 1
+                    yield archive
+                if progress is not None and time.monotonic() >= next_report:
+                    progress(seen, found)
+                    next_report = time.monotonic() + PROGRESS_INTERVAL
+        finally:
+            for future, _ in pending:
+                future.cancel()
+
+    if progress is not None:
+        progress(seen, found)
+    trace.count("entries_seen", seen)
+
+
+def scan_data_folder(
+    mods_dir, trace=NULL_TRACE, cancel=None, progress=None, walk=None
+):
+    """
+    Scan the data folder for mod archives.
+    Returns a ScanResult with the archives in directory order. The result is
+    immutable and owned by the caller, so scans of the same or different
+    folders can run on several threads at once. See iter_archives for
+    cancel and progress. With walk (a WalkOptions) subfolders are scanned
+    too, see iter_archives_recursive.
+    """
+    if not os.path.isdir(mods_dir):
+        raise FileNotFoundError(f"Data folder '{mods_dir}' does not exist!")
+
+    dir_mtime = os.stat(mods_dir).st_mtime_ns
+    if walk is None:
+        entries = tuple(iter_archives(mods_dir, trace, cancel, progress))
+        scan = ScanResult(mods_dir, dir_mtime, entries)
+    else:
+        subdirs = []
+        entries = tuple(
+            iter_archives_recursive(mods_dir, walk, trace, cancel, progress, subdirs)
+        )
+        scan = ScanResult(mods_dir, dir_mtime, entries, tuple(subdirs))
+    trace.record_scan(scan)
+    return scan
+
+
+def scan_is_current(scan):
+    """
+    Check whether scan still describes its data folder without listing the
+    folder again. Adding, removing or renaming an archive moves the folder
+    mtime; a mod replaced in place keeps it, so every archive's size and
+    mtime are compared too. That is one stat per archive instead of reading
+    every loose file in the folder.
+    """
+    try:
+        if os.stat(scan.data_dir).st_mtime_ns != scan.dir_mtime:
+            return False
+        for rel, mtime in scan.subdirs:
+            if os.stat(os.path.join(scan.data_dir, rel)).st_mtime_ns != mtime:
+                return False
+        for entry in scan.entries:
+            stat = os.stat(os.path.join(scan.data_dir, entry.name))
+            if (stat.st_size, stat.st_mtime_ns) != (entry.size, entry.mtime):
+                return False
+    except OSError:
+        return False
+    return True
+
+
+class ModClassifier:
+    """
+    Index compiled once from the catalog that maps a case-folded archive name
+    to its section and its rank within that section, so classifying a file
+    is a single dict lookup no matter how large the catalog is.
+    """
+
+    def __init__(self, filenames, default_mods, default_index, place_last, index):
+        self.filenames = tuple(filenames)
+        self.default_mods = tuple(tuple(mods) for mods in default_mods)
+        self.default_index = default_index
+        self.place_last = place_last
+        self.index = index
+
+    @classmethod
+    def build(cls, sections, priority, default_index, place_last):
+        """
+        Compile the index for a list of CatalogSection. A mod listed in more
+        than one section goes in the section named by priority, otherwise
+        in the first section that lists it.
+        """
+        filenames = [section.filename for section in sections]
+        preferred = {
+            mod.casefold(): filenames.index(filename)
+            for mod, filename in priority.items()
+        }
+
+        index = {}
+        for section_index, section in enumerate(sections):
+            for rank, mod in enumerate(section.mods):
+                key = mod.casefold()
+                if key in index and preferred.get(key) != section_index:
+                    continue
+                index[key] = (section_index, rank)
+
+        default_mods = [section.default_mods for section in sections]
+        return cls(filenames, default_mods, default_index, place_last, index)
+
+    def state(self):
+        """
+        Plain data for the compiled catalog cache.
+        """
+        return (
+            self.filenames,
+            self.default_mods,
+            self.default_index,
+            self.place_last,
+            self.index,
+        )
+
+    def classify(self, archives):
+        """
+        Sort archive names into sections. Returns a Classification.
+        """
+        known = [[] for _ in self.filenames]
+        other = [[] for _ in self.filenames]
+        index = self.index
+        default_index = self.default_index
+        for file in archives:
+            # Archives found in subfolders are looked up by their file name
+            match = index.get(file.rpartition("/")[2].casefold())
+            if match is None:
+                # If a mod doesn't appear in the one of the other mod lists, add it to the default
+                other[default_index].append(file)
+            else:
+                known[match[0]].append((match[1], file))
+
+        sections = []
+        total = 0
+        for filename, default_mods, known_mods, other_mods in zip(
+            self.filenames, self.default_mods, known, other
+        ):
+            known_mods.sort()
+            total += len(known_mods) + len(other_mods)
+            sections.append(
+                SectionMods(
+                    filename,
+                    default_mods,
+                    tuple(mod for _, mod in known_mods),
+                    tuple(other_mods),
+                )
+            )
+        return Classification(tuple(sections), total, self.place_last)
+
+
+class CatalogError(ValueError):
+    """
+    Raised when a catalog file is missing or does not validate.
+    """
+
+
+CatalogSection = namedtuple("CatalogSection", ["filename", "mods", "default_mods"])
+Catalog = namedtuple(
+    "Catalog",
+    [
+        "sections",
+        "priority",
+        "default_section",
+        "mod_to_place_last",
+        "digest",
+        "key",
+        "classifier",
+    ],
 )
 
-args = parser.parse_args()
-
-# Assign arguments to variables
-mods_dir = args.datafolder
-filename = args.inifilename
-ini_file_path = os.path.join(args.inifolder, filename)
-is_admin = args.runasadmin
-import_ini = args.copyinicontents
-
-# Configuration arrays, these are mods that should go in specific
-# lists, all other go in sResourceArchive2List
-RESOURCE_MAP = [
-    {
-        "filename": "sResourceStartUpArchiveList",
-        "mods": [
-            "BakaFile - Main.ba2",
-            "IconTag.ba2",
-            "IconSortingRatmonkeys.ba2",
-            "MMM - Country Roads.ba2",
-            "ImpUlt.ba2",
-            "Quizzless Apalachia.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-    {
-        "filename": "sResourceArchiveList2",
-        "mods": [
-            "PerkLoadoutManager.ba2",
-            "IUMesh.ba2",
-            "MoreWhereThatCameFrom.ba2",
-            "Prismatic_Lasers_76_Lightblue.ba2",
-            "OptimizedSonar.ba2",
-            "Silentchameleon.ba2",
-            "CleanPip.ba2",
-            "classicFOmus_76.ba2",
-            "nootnoot.ba2",
-            "MenuMusicReplacer.ba2",
-            "BullBarrel.ba2",
-            "EVB76NevernudeFemale - Meshes.ba2",
-            "EVB76NevernudeFemale - Textures.ba2",
-            "EVB76NevernudeMale - Meshes.ba2",
-            "EVB76NevernudeMale - Textures.ba2",
-            "EVB76 - Meshes.ba2",
-            "EVB76 - Textures.ba2",
-            "EVB76Nevernude - Meshes.ba2",
-            "EVB76Nevernude - Textures.ba2",
-            "BoxerShorts.ba2",
-            "MaleUnderwear.ba2",
-            "FemaleUnderwear.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-    {
-        "filename": "sResourceIndexFileList",
-        "mods": [
-            "UHDmap.ba2",
-            "EnhancedBlood - Textures.ba2",
-            "EnhancedBlood - Meshes.ba2",
-            "MapMarkers.ba2",
-            "Radiant_Clouds.ba2",
-            "SpoilerFreeMap.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-    {
-        "filename": "sResourceArchive2List",
-        "mods": [
-            "PerkLoadoutManager.ba2",
-            "ChatMod.ba2",
-            "ShowHealthReRedux.ba2",
-            "ShowHealth.ba2",
-            "CompatibleShowHealthRedux.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-]
-# The array index from the RESOURCE_MAP for sResourceArchive2List
-SR_2LIST_INDEX = 3
-MOD_TO_PLACE_LAST = "HUDModLoader.ba2"
-
-# Re-run the program with admin rights if needed
-if is_admin:
-    ctypes.windll.shell32.ShellExecuteW(
-        None, "runas", sys.executable, __file__, None, 1
-    )
-    sys.exit(0)
-
-# Create any missing folders
-os.makedirs(os.path.dirname(ini_file_path), exist_ok=True)
-
-# Validate that the data folder exists
-if not os.path.exists(mods_dir):
-    print(f"Error: Data folder '{mods_dir}' does not exist!")
-    sys.exit(1)
-
-print(f"Scanning for mods in: {mods_dir}")
-print(f"Creating ini file at: {ini_file_path}")
-
-# Open the Custom.ini file for writing
-try:
-    with open(ini_file_path, "w+", encoding="utf-8") as custom_ini_file:
-        # Write the section header to the file
-        custom_ini_file.write("[Archive]\r\n")
-
-        # Loop through the resource map and add mods to the correct places
-        for _, _, filenames in os.walk(mods_dir):
-            for file in filenames:
-                # Make sure the file is not an official file (starts with "SeventySix")
-                # and is a ba2 (file extension)
-                if not file.startswith("SeventySix") and file.lower().endswith(".ba2"):
-                    found = False
-                    for resource in RESOURCE_MAP:
-                        if file in resource["mods"]:
-                            resource["found_mods"].append(file)
-                            found = True
-                            break
-                    # If a mod doesn't appear in the one of the other mod lists, add it to the default
-                    if not found:
-                        RESOURCE_MAP[SR_2LIST_INDEX]["found_mods"].append(file)
-            break
-
-        # Loop through the resource map and add the correct lines to the ini file
-        for resource in RESOURCE_MAP:
-            if resource["found_mods"]:
-                found_mods = set(resource["found_mods"])
-                mods = resource["mods"]
-                mod_list = ", ".join(mod for mod in mods if mod in found_mods)
-
-                # Get any mods that don't show up in the mods list (for the default list)
-                diff_list = [item for item in found_mods if item not in mods]
-                if diff_list:
-                    diff_list.sort()
-
-                    # Ensure MOD_TO_PLACE_LAST is at the end of the list
-                    if MOD_TO_PLACE_LAST in diff_list:
-                        diff_list.remove(MOD_TO_PLACE_LAST)
-                        diff_list.append(MOD_TO_PLACE_LAST)
-
-                    diff_list = ", " + ", ".join(diff_list)
-                else:
-                    diff_list = ""
-
-                # Make the default list a string
-                default_mods = ", ".join(resource["default_mods"])
-
-                # Write the resource line to the ini file without leading comma
-                line_content = "{}{}".format(default_mods, mod_list + diff_list)
-                if line_content.startswith(", "):
-                    line_content = line_content[2:]
-
-                custom_ini_file.write(
-                    "{} = {}\r\n".format(resource["filename"], line_content)
+
+def _check_names(value, what, path):
+    """
+    Make sure a catalog value is a list of strings.
+    """
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise CatalogError(f"{path}: '{what}' must be a list of strings")
+    return value
+
+
+def merge_catalog_layer(merged, layer, path):
+    """
+    Validate one parsed catalog layer and merge it into merged.
+    The first layer defines the sections, later layers are user overrides:
+    their mods are added to the named section and take priority over the
+    base placement, "remove" drops mods from every section.
+    """
+    if not isinstance(layer, dict):
+        raise CatalogError(f"{path}: catalog must be a JSON object")
+
+    sections = merged.setdefault("sections", [])
+    priority = merged.setdefault("priority", {})
+    is_override = bool(sections)
+
+    removed = _check_names(layer.get("remove", []), "remove", path)
+    removed = {mod.casefold() for mod in removed}
+    if removed:
+        for section in sections:
+            section["mods"] = [
+                mod for mod in section["mods"] if mod.casefold() not in removed
+            ]
+        for mod in list(priority):
+            if mod.casefold() in removed:
+                del priority[mod]
+
+    layer_sections = layer.get("sections", [])
+    if not isinstance(layer_sections, list):
+        raise CatalogError(f"{path}: 'sections' must be a list")
+    for entry in layer_sections:
+        if not isinstance(entry, dict) or not isinstance(entry.get("filename"), str):
+            raise CatalogError(f"{path}: every section needs a 'filename'")
+        filename = entry["filename"]
+        mods = _check_names(entry.get("mods", []), filename, path)
+        default_mods = _check_names(entry.get("default_mods", []), filename, path)
+
+        section = next((s for s in sections if s["filename"] == filename), None)
+        if section is None:
+            section = {"filename": filename, "mods": [], "default_mods": []}
+            sections.append(section)
+        known = {mod.casefold() for mod in section["mods"]}
+        section["mods"].extend(mod for mod in mods if mod.casefold() not in known)
+        if default_mods:
+            section["default_mods"] = list(default_mods)
+        if is_override:
+            priority.update((mod, filename) for mod in mods)
+
+    layer_priority = layer.get("priority", {})
+    if not isinstance(layer_priority, dict):
+        raise CatalogError(f"{path}: 'priority' must be an object")
+    priority.update(layer_priority)
+
+    for key in ("default_section", "mod_to_place_last"):
+        if key in layer:
+            if not isinstance(layer[key], str):
+                raise CatalogError(f"{path}: '{key}' must be a string")
+            merged[key] = layer[key]
+
+
+def compile_catalog(merged, digest, key=()):
+    """
+    Check the merged catalog and build its classifier. Returns a Catalog.
+    """
+    sections = tuple(
+        CatalogSection(s["filename"], tuple(s["mods"]), tuple(s["default_mods"]))
+        for s in merged.get("sections", [])
+    )
+    filenames = [section.filename for section in sections]
+    if not sections:
+        raise CatalogError("The catalog does not define any sections")
+    default_section = merged.get("default_section", filenames[-1])
+    if default_section not in filenames:
+        raise CatalogError(f"Unknown default section '{default_section}'")
+    for mod, filename in merged["priority"].items():
+        if filename not in filenames:
+            raise CatalogError(f"Unknown section '{filename}' for '{mod}'")
+
+    classifier = ModClassifier.build(
+        sections,
+        merged["priority"],
+        filenames.index(default_section),
+        merged.get("mod_to_place_last", ""),
+    )
+    return Catalog(
+        sections,
+        dict(merged["priority"]),
+        default_section,
+        merged.get("mod_to_place_last", ""),
+        digest,
+        key,
+        classifier,
+    )
+
+
+def default_catalog_paths():
+    """
+    The shipped catalog plus the user override file when it exists, both
+    looked up next to this script. A frozen build falls back to the
+    catalog bundled into it.
+    """
+    catalog_file = os.path.join(SCRIPT_DIR, CATALOG_FILE)
+    if not os.path.exists(catalog_file):
+        bundled = os.path.join(BUNDLE_DIR, CATALOG_FILE)
+        if os.path.exists(bundled):
+            catalog_file = bundled
+    paths = [catalog_file]
+    user_catalog = os.path.join(SCRIPT_DIR, USER_CATALOG_FILE)
+    if os.path.exists(user_catalog):
+        paths.append(user_catalog)
+    return paths
+
+
+def _catalog_cache_key(paths):
+    key = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise CatalogError(f"Catalog file '{path}' not found!")
+        key.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+def _catalog_from_state(state):
+    sections = tuple(CatalogSection(*section) for section in state["sections"])
+    classifier = ModClassifier(*state["classifier"])
+    return Catalog(
+        sections,
+        state["priority"],
+        state["default_section"],
+        state["mod_to_place_last"],
+        state["digest"],
+        state["key"],
+        classifier,
+    )
+
+
+def _write_catalog_cache(cache_file, key, catalog):
+    state = {
+        "version": CATALOG_CACHE_VERSION,
+        "key": key,
+        "digest": catalog.digest,
+        "sections": tuple(tuple(section) for section in catalog.sections),
+        "priority": catalog.priority,
+        "default_section": catalog.default_section,
+        "mod_to_place_last": catalog.mod_to_place_last,
+        "classifier": catalog.classifier.state(),
+    }
+    save_cache(cache_file, state)
+
+
+def load_catalog(paths=None, cache_file=None):
+    """
+    Load, validate and compile the catalog layers in paths (default: the
+    shipped catalog plus the user override file). The compiled result is
+    cached in cache_file keyed by each layer's mtime and size, and by the
+    hash of their contents, so unchanged catalogs skip parsing. Pass
+    cache_file=False to disable the cache.
+    """
+    if paths is None:
+        paths = default_catalog_paths()
+    if cache_file is None:
+        cache_file = os.path.join(SCRIPT_DIR, CATALOG_CACHE_FILE)
+
+    key = _catalog_cache_key(paths)
+    state = load_cache(cache_file, CATALOG_CACHE_VERSION) if cache_file else None
+    if state is not None and state["key"] == key:
+        return _catalog_from_state(state)
+
+    sources = []
+    for path in paths:
+        with open(path, "rb") as f:
+            sources.append(f.read())
+    digest = hashlib.sha256(b"\0".join(sources)).hexdigest()
+
+    # Touched but unchanged files only need their key refreshed
+    if state is not None and state["digest"] == digest:
+        catalog = _catalog_from_state(state)._replace(key=key)
+    else:
+        merged = {}
+        for path, source in zip(paths, sources):
+            try:
+                layer = json.loads(source.decode("utf-8"))
+            except ValueError as e:
+                raise CatalogError(f"{path}: {e}")
+            merge_catalog_layer(merged, layer, path)
+        catalog = compile_catalog(merged, digest, key)
+
+    if cache_file:
+        _write_catalog_cache(cache_file, key, catalog)
+    return catalog
+
+
+_default_catalog = None
+
+
+def get_catalog():
+    """
+    Return the default catalog, loading it on first use.
+    """
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = load_catalog()
+    return _default_catalog
+
+
+def classify_mods(archives, classifier=None):
+    """
+    Sort archive names into the catalog sections.
+    A mod goes in the section that lists it (see the catalog "priority" for
+    mods listed twice), all others go in the default section.
+    Returns a Classification.
+    """
+    if classifier is None:
+        classifier = get_catalog().classifier
+    return classifier.classify(archives)
+
+
+def order_section(section, place_last=""):
+    """
+    Return the mods of a section in the order they are written to the ini.
+    Known mods keep the catalog order, the rest are sorted alphabetically
+    with place_last (the catalog's mod_to_place_last) at the end.
+    """
+    diff_list = sorted(section.other_mods)
+
+    # Ensure the mod to place last is at the end of the list
+    last = [mod for mod in diff_list if mod.rpartition("/")[2] == place_last]
+    for mod in last:
+        diff_list.remove(mod)
+        diff_list.append(mod)
+
+    return list(section.default_mods) + list(section.known_mods) + diff_list
+
+
+def load_order(classification):
+    """
+    Return every classified mod in the order the rendered ini lists them,
+    section by section. This is the order the game loads the archives in.
+    """
+    return [
+        mod
+        for section in classification.sections
+        for mod in order_section(section, classification.place_last)
+        if section.found_mods
+    ]
+
+
+def render_ini(classification):
+    """
+    Render the [Archive] block for a Classification.
+    Sections without any found mods are left out.
+    """
+    lines = ["[Archive]\r\n"]
+    for section in classification.sections:
+        if section.found_mods:
+            mod_list = ", ".join(order_section(section, classification.place_last))
+            lines.append("{} = {}\r\n".format(section.filename, mod_list))
+    return "".join(lines)
+
+
+def _ini_line_kind(line):
+    """
+    Classify one raw ini line as ("section", name), ("key", name) or
+    (None, None) for comments, blank lines and anything else.
+    Names are stripped and lower-cased, ini keys are case-insensitive.
+    """
+    stripped = line.strip()
+    if stripped.startswith(b"[") and stripped.endswith(b"]"):
+        return "section", stripped[1:-1].strip().lower()
+    if not stripped or stripped[:1] in (b";", b"#") or b"=" not in stripped:
+        return None, None
+    return "key", stripped.split(b"=", 1)[0].strip().lower()
+
+
+def index_ini(path, first_section=b""):
+    """
+    Read an ini file once, line by line, and record where everything is
+    without keeping any lines: IniIndex.sections maps each section to its
+    first header line and the byte ranges of its blocks (a section can
+    appear more than once), IniIndex.keys maps (section, key) to the offset
+    of the last line that sets it. Lines before the first header belong to
+    first_section.
+    """
+    sections = {}
+    keys = {}
+    section = first_section
+    header = None
+    start = offset = 0
+
+    with open(path, "rb") as f:
+        for line in f:
+            if offset == 0 and line.startswith(UTF8_BOM):
+                # Skip the BOM so it never ends up in the middle of the output
+                offset = start = len(UTF8_BOM)
+                line = line[offset:]
+            kind, name = _ini_line_kind(line)
+            if kind == "section":
+                sections.setdefault(section, (header, []))[1].append((start, offset))
+                section, header = name, line
+                start = offset + len(line)
+            elif kind == "key":
+                keys[section, name] = offset
+            offset += len(line)
+    sections.setdefault(section, (header, []))[1].append((start, offset))
+    return IniIndex(sections, keys)
+
+
+def _batched(lines, size=65536):
+    """
+    Join a stream of lines into chunks of about size bytes for writing.
+    """
+    batch = []
+    batch_size = 0
+    for line in lines:
+        batch.append(line)
+        batch_size += len(line)
+        if batch_size >= size:
+            yield b"".join(batch)
+            batch = []
+            batch_size = 0
+    if batch:
+        yield b"".join(batch)
+
+
+def merge_ini(generated, import_ini, index=None):
+    """
+    Yield the generated ini (bytes) followed by import_ini merged into it.
+    Sections of the import file are written once, in order of first
+    appearance, with the lines of every block of that section. Precedence:
+    a key the generated ini sets always wins, then the last occurrence of a
+    key in the import file; comments and blank lines are kept. Lines before
+    the import file's first header, and its own [Archive] blocks, go into
+    the generated [Archive] section. The import file is streamed, only the
+    offsets from index_ini() are held in memory.
+    """
+    if index is None:
+        index = index_ini(import_ini, ARCHIVE_SECTION)
+    generated_keys = set()
+    section = b""
+    for line in generated.splitlines():
+        kind, name = _ini_line_kind(line)
+        if kind == "section":
+            section = name
+        elif kind == "key":
+            generated_keys.add((section, name))
+
+    yield generated
+    yield from _batched(_merged_import_lines(import_ini, index, generated_keys))
+
+
+def _merged_import_lines(import_ini, index, generated_keys):
+    with open(import_ini, "rb") as f:
+        for section, (header, blocks) in index.sections.items():
+            if section != ARCHIVE_SECTION and header is not None:
+                yield header if header.endswith(b"\n") else header + b"\r\n"
+            for start, end in blocks:
+                f.seek(start)
+                offset = start
+                while offset < end:
+                    line = f.readline()
+                    line_offset = offset
+                    offset += len(line)
+                    kind, name = _ini_line_kind(line)
+                    if kind == "key" and (
+                        (section, name) in generated_keys
+                        or index.keys[section, name] != line_offset
+                    ):
+                        continue
+                    yield line if line.endswith(b"\n") else line + b"\r\n"
+
+
+def write_ini(ini_file_path, content, import_ini=None):
+    """
+    Write the rendered content to the ini file, creating any missing folders.
+    If import_ini is given it is merged in after the rendered content by
+    section and key, see merge_ini(). The output is streamed: first compared
+    against the file on disk, and only when it differs written again to a
+    temp file that replaces it. WriteResult.bytes_written is 0 when the file
+    was left alone.
+    WriteResult.imported is None when nothing was requested and False when the
+    import file could not be found.
+    """
+    folder = os.path.dirname(ini_file_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    generated = content.encode("utf-8")
+    imported = None
+    if import_ini:
+        imported = os.path.exists(import_ini)
+
+    if imported:
+        index = index_ini(import_ini, ARCHIVE_SECTION)
+
+        def chunks():
+            return merge_ini(generated, import_ini, index)
+
+    else:
+
+        def chunks():
+            return [generated]
+
+    if file_matches(ini_file_path, chunks()):
+        return WriteResult(ini_file_path, 0, imported, False)
+
+    bytes_written = replace_file(ini_file_path, chunks())
+    return WriteResult(ini_file_path, bytes_written, imported, True)
+
+
+def _ini_value(line):
+    return line.split(b"=", 1)[1].strip()
+
+
+def _line_ending(line):
+    return line[len(line.rstrip(b"\r\n")) :]
+
+
+def _scan_archive_keys(ini_file_path, managed):
+    """
+    First pass of update_ini(): find the newline style, where the first
+    [Archive] block ends (after its last key line) and which managed keys
+    the file already sets. Returns (newline, insert_at, present), insert_at
+    is None when the file has no [Archive] section.
+    """
+    newline = None
+    insert_at = None
+    present = set()
+    section = None
+    in_first_block = False
+    offset = 0
+    with open(ini_file_path, "rb") as f:
+        for line in f:
+            if newline is None and line.endswith(b"\n"):
+                newline = _line_ending(line)
+            if offset == 0 and line.startswith(UTF8_BOM):
+                offset = len(UTF8_BOM)
+                line = line[offset:]
+            kind, name = _ini_line_kind(line)
+            offset += len(line)
+            if kind == "section":
+                section = name
+                in_first_block = section == ARCHIVE_SECTION and insert_at is None
+                if in_first_block:
+                    insert_at = offset
+            elif kind == "key" and section == ARCHIVE_SECTION:
+                if in_first_block:
+                    insert_at = offset
+                if name in managed:
+                    present.add(name)
+    return newline or b"\r\n", insert_at, present
+
+
+def update_ini(ini_file_path, content, managed=None):
+    """
+    Update the sResource* keys of an existing ini in place. Only the keys
+    named in managed (section filenames, by default the keys content sets) are
+    touched under [Archive]: each is replaced by its line from content, or
+    removed when content no longer sets it. Keys the file is missing are
+    added after the last key of its first [Archive] block, and a file
+    without [Archive] gets content's block in front. Every other byte,
+    comments, order and line endings included, is kept. The file is read
+    as a stream and only replaced when the result differs.
+    Falls back to write_ini() when the ini does not exist yet.
+    """
+    if not os.path.exists(ini_file_path) or not os.path.getsize(ini_file_path):
+        return write_ini(ini_file_path, content)
+
+    rendered = {}
+    for line in content.encode("utf-8").splitlines():
+        kind, name = _ini_line_kind(line)
+        if kind == "key":
+            rendered[name] = line
+    values = {name: _ini_value(line) for name, line in rendered.items()}
+    if managed is None:
+        managed = set(rendered)
+    else:
+        managed = {key.lower().encode("utf-8") for key in managed}
+
+    newline, insert_at, present = _scan_archive_keys(ini_file_path, managed)
+    missing = [line for name, line in rendered.items() if name not in present]
+
+    def lines():
+        emitted = set()
+        section = None
+        offset = 0
+        with open(ini_file_path, "rb") as f:
+            for line in f:
+                if offset == 0:
+                    if line.startswith(UTF8_BOM):
+                        yield UTF8_BOM
+                        offset = len(UTF8_BOM)
+                        line = line[offset:]
+                    if insert_at is None:
+                        yield b"[Archive]" + newline
+                        yield from (missing_line + newline for missing_line in missing)
+                kind, name = _ini_line_kind(line)
+                offset += len(line)
+                if kind == "section":
+                    section = name
+                elif kind == "key" and section == ARCHIVE_SECTION and name in managed:
+                    # Replace the first occurrence, drop repeats and stale keys.
+                    # A line that already has the right value keeps its spacing.
+                    if name not in rendered or name in emitted:
+                        line = b""
+                    elif _ini_value(line) != values[name]:
+                        line = rendered[name] + _line_ending(line)
+                    emitted.add(name)
+                if offset == insert_at and missing:
+                    if line and not line.endswith(b"\n"):
+                        line += newline
+                    yield line
+                    yield from (missing_line + newline for missing_line in missing)
+                    continue
+                yield line
+
+    def chunks():
+        return _batched(lines())
+
+    if file_matches(ini_file_path, chunks()):
+        return WriteResult(ini_file_path, 0, None, False)
+
+    bytes_written = replace_file(ini_file_path, chunks())
+    return WriteResult(ini_file_path, bytes_written, None, True)
+
+
+def generate_ini(
+    mods_dir, ini_file_path, import_ini=None, catalog=None, trace=NULL_TRACE
+):
+    """
+    Scan, classify, render and write in one call. Returns a GenerateResult.
+    """
+    if catalog is None:
+        with trace.phase("catalog"):
+            catalog = get_catalog()
+    with trace.phase("scan"):
+        scan = scan_data_folder(mods_dir, trace)
+    with trace.phase("classify"):
+        classification = classify_mods(scan.archives, catalog.classifier)
+    trace.record_classification(classification)
+    with trace.phase("render"):
+        content = render_ini(classification)
+    with trace.phase("write"):
+        write = write_ini(ini_file_path, content, import_ini)
+    trace.record_write(write)
+    return GenerateResult(scan, classification, write)
+
+
+class ProfileError(ValueError):
+    """
+    Raised when a profiles file is missing or does not validate.
+    """
+
+
+def load_profiles(profiles_path, ini_folder):
+    """
+    Read a profiles file. Each profile has a "name", an "output" ini path
+    (relative to ini_folder), optional "include" and "exclude" lists of
+    archive name globs and an optional "import" file (relative to the
+    profiles file).
+    Returns a list of Profile.
+    """
+    try:
+        with open(profiles_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except OSError as e:
+        raise ProfileError(f"Could not read profiles file '{profiles_path}': {e}")
+    except ValueError as e:
+        raise ProfileError(f"{profiles_path}: {e}")
+
+    entries = data.get("profiles") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ProfileError(f"{profiles_path}: 'profiles' must be a non-empty list")
+
+    profiles = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("name"), str):
+            raise ProfileError(f"{profiles_path}: every profile needs a 'name'")
+        name = entry["name"]
+        output = entry.get("output", f"{name}.ini")
+        if not isinstance(output, str):
+            raise ProfileError(f"{profiles_path}: 'output' of '{name}' must be a path")
+        include = entry.get("include", [])
+        exclude = entry.get("exclude", [])
+        for value in (include, exclude):
+            if not isinstance(value, list) or not all(
+                isinstance(v, str) for v in value
+            ):
+                raise ProfileError(
+                    f"{profiles_path}: 'include' and 'exclude' of '{name}' "
+                    "must be lists of globs"
                 )
+        import_ini = entry.get("import")
+        if import_ini:
+            import_ini = os.path.join(os.path.dirname(profiles_path), import_ini)
+        profiles.append(
+            Profile(
+                name,
+                os.path.join(ini_folder, output),
+                tuple(include),
+                tuple(exclude),
+                import_ini,
+            )
+        )
+
+    outputs = [os.path.normcase(os.path.abspath(p.output)) for p in profiles]
+    if len(set(outputs)) != len(outputs):
+        raise ProfileError(f"{profiles_path}: two profiles write the same output")
+    return profiles
+
 
-        # Copy contents of a custom file into the custom.ini
+def _compile_globs(patterns):
+    """
+    One case-insensitive regex for a list of globs, None for an empty list.
+    """
+    if not patterns:
+        return None
+    return re.compile(
+        "|".join(fnmatch.translate(pattern) for pattern in patterns), re.IGNORECASE
+    )
+
+
+def filter_scan(scan, include=(), exclude=()):
+    """
+    Return a ScanResult with only the archives matching an include glob
+    (all of them when there are none) and no exclude glob.
+    """
+    include = _compile_globs(include)
+    exclude = _compile_globs(exclude)
+    entries = tuple(
+        entry
+        for entry in scan.entries
+        if (include is None or include.match(entry.name))
+        and not (exclude is not None and exclude.match(entry.name))
+    )
+    return scan._replace(entries=entries)
+
+
+def generate_profile(scan, profile, catalog):
+    """
+    Render and write one profile from an existing scan. Returns a ProfileResult,
+    errors are reported in it rather than raised.
+    """
+    classification = None
+    try:
+        profile_scan = filter_scan(scan, profile.include, profile.exclude)
+        classification = classify_mods(profile_scan.archives, catalog.classifier)
+        content = render_ini(classification)
+        write = write_ini(profile.output, content, profile.import_ini)
+    except Exception as e:
+        return ProfileResult(profile, classification, None, e)
+    return ProfileResult(profile, classification, write, None)
+
+
+def generate_profiles(scan, profiles, catalog=None, max_workers=None):
+    """
+    Render and write every profile from a single scan, spreading the writes
+    across a thread pool. Returns a ProfileResult per profile, in order.
+    """
+    if catalog is None:
+        catalog = get_catalog()
+    if not profiles:
+        return []
+    if max_workers is None:
+        max_workers = min(8, len(profiles))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda profile: generate_profile(scan, profile, catalog), profiles
+        )
+        return list(results)
+
+
+class FleetError(ValueError):
+    """
+    Raised when a fleet manifest is missing or does not validate.
+    """
+
+
+def load_fleet(fleet_path, ini_folder, update=False):
+    """
+    Read a fleet manifest. Each install has a "name", a "datafolder", an
+    optional "inifolder" (ini_folder when missing), "inifilename", "import"
+    file and "update" flag (update when missing). Relative paths in the
+    manifest are relative to the manifest, ini_folder to the current folder.
+    Returns a list of Install.
+    """
+    try:
+        with open(fleet_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except OSError as e:
+        raise FleetError(f"Could not read fleet manifest '{fleet_path}': {e}")
+    except ValueError as e:
+        raise FleetError(f"{fleet_path}: {e}")
+
+    entries = data.get("installs") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise FleetError(f"{fleet_path}: 'installs' must be a non-empty list")
+
+    base_dir = os.path.dirname(fleet_path)
+    installs = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("name"), str):
+            raise FleetError(f"{fleet_path}: every install needs a 'name'")
+        name = entry["name"]
+        paths = {}
+        for key, default in (
+            ("datafolder", None),
+            ("inifolder", os.path.abspath(ini_folder)),
+            ("inifilename", FILENAME),
+            ("import", None),
+        ):
+            value = entry.get(key, default)
+            if value is None and key != "import":
+                raise FleetError(f"{fleet_path}: install '{name}' needs a '{key}'")
+            if value is not None and not isinstance(value, str):
+                raise FleetError(f"{fleet_path}: '{key}' of '{name}' must be a path")
+            paths[key] = value
+        install_update = entry.get("update", update)
+        if not isinstance(install_update, bool):
+            raise FleetError(
+                f"{fleet_path}: 'update' of '{name}' must be true or false"
+            )
+        if install_update and paths["import"]:
+            raise FleetError(
+                f"{fleet_path}: 'update' can't be combined with 'import' in '{name}'"
+            )
+        import_ini = paths["import"]
         if import_ini:
-            if os.path.exists(import_ini):
-                with open(import_ini, "r", encoding="utf-8") as import_file:
-                    custom_ini_file.write(import_file.read())
-                print(f"Imported contents from: {import_ini}")
+            import_ini = os.path.join(base_dir, import_ini)
+        installs.append(
+            Install(
+                name,
+                os.path.join(base_dir, paths["datafolder"]),
+                os.path.join(base_dir, paths["inifolder"], paths["inifilename"]),
+                import_ini,
+                install_update,
+            )
+        )
+
+    outputs = [os.path.normcase(os.path.abspath(i.ini_file)) for i in installs]
+    if len(set(outputs)) != len(outputs):
+        raise FleetError(f"{fleet_path}: two installs write the same ini")
+    return installs
+
+
+def generate_install(install, catalog, walk=None):
+    """
+    Scan, classify and write the ini of one install, timing each phase in
+    its own Trace. Returns an InstallResult, errors are reported in it rather
+    than raised.
+    """
+    trace = Trace()
+    classification = None
+    write = None
+    try:
+        with trace.phase("scan"):
+            scan = scan_data_folder(install.data_dir, trace, walk=walk)
+        with trace.phase("classify"):
+            classification = classify_mods(scan.archives, catalog.classifier)
+        with trace.phase("render"):
+            content = render_ini(classification)
+        with trace.phase("write"):
+            if install.update:
+                managed = [section.filename for section in classification.sections]
+                write = update_ini(install.ini_file, content, managed)
+            else:
+                write = write_ini(install.ini_file, content, install.import_ini)
+        trace.record_write(write)
+    except Exception as e:
+        return InstallResult(install, classification, write, e, trace)
+    return InstallResult(install, classification, write, None, trace)
+
+
+def generate_fleet(installs, catalog=None, walk=None, max_workers=None):
+    """
+    Generate the ini of every install with one shared catalog. Installs run
+    on a bounded thread pool so scans and writes on different drives overlap.
+    Returns an InstallResult per install, in order.
+    """
+    if catalog is None:
+        catalog = get_catalog()
+    if not installs:
+        return []
+    if max_workers is None:
+        max_workers = FLEET_WORKERS
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(installs))) as executor:
+        results = executor.map(
+            lambda install: generate_install(install, catalog, walk), installs
+        )
+        return list(results)
+
+
+def _stat_key(path):
+    """
+    [mtime_ns, size] of a file, or None when there is no such file.
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def snapshot_path_for(ini_file_path):
+    return ini_file_path + SNAPSHOT_SUFFIX
+
+
+def _walk_key(walk):
+    return None if walk is None else [walk.max_depth, list(walk.exclude)]
+
+
+def make_snapshot(
+    scan, catalog, ini_file_path, import_ini=None, walk=None, options=None
+):
+    """
+    Record what a generated ini was built from: the data folder mtime, every
+    archive's name/size/mtime, the catalog hash, the ini and import files and
+    the output_options() it was written with. Recursive scans also record
+    their options and subfolder mtimes.
+    """
+    return {
+        "version": SNAPSHOT_VERSION,
+        "data_dir": os.path.abspath(scan.data_dir),
+        "dir_mtime": scan.dir_mtime,
+        "walk": _walk_key(walk),
+        "options": options or {},
+        "subdirs": [list(subdir) for subdir in scan.subdirs],
+        "archives": [[entry.name, entry.size, entry.mtime] for entry in scan.entries],
+        "catalog": catalog.digest,
+        "catalog_key": [list(key) for key in catalog.key],
+        "ini": _stat_key(ini_file_path),
+        "import": _stat_key(import_ini),
+    }
+
+
+def load_snapshot(snapshot_path):
+    """
+    Read a saved snapshot, returns None if there is no usable one.
+    """
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def save_snapshot(snapshot_path, snapshot):
+    """
+    Write a snapshot, leaving the file untouched when it already holds the
+    same bytes.
+    """
+    data = [json.dumps(snapshot).encode("utf-8")]
+    if not file_matches(snapshot_path, data):
+        replace_file(snapshot_path, data)
+
+
+def snapshot_is_current(
+    snapshot,
+    mods_dir,
+    ini_file_path,
+    catalog_paths,
+    import_ini=None,
+    scan=None,
+    walk=None,
+    options=None,
+):
+    """
+    Check whether regenerating would produce the ini recorded in snapshot.
+    Without a scan only the data folder itself (and for recursive scans each
+    subfolder) is stat'ed: adding, removing or renaming an archive changes
+    its mtime. With a scan (when a folder mtime moved) the archive names are
+    compared instead. With skip_duplicates in options the output depends on
+    archive contents too, so each archive's size and mtime are compared as
+    well, which catches a mod replaced in place.
+    """
+    by_content = bool((options or {}).get("skip_duplicates"))
+    if snapshot["data_dir"] != os.path.abspath(mods_dir):
+        return False
+    if snapshot.get("walk") != _walk_key(walk):
+        return False
+    if snapshot.get("options") != (options or {}):
+        return False
+    if scan is None:
+        try:
+            if os.stat(mods_dir).st_mtime_ns != snapshot["dir_mtime"]:
+                return False
+            for rel, mtime in snapshot.get("subdirs", ()):
+                if os.stat(os.path.join(mods_dir, rel)).st_mtime_ns != mtime:
+                    return False
+            if by_content:
+                for name, size, mtime in snapshot["archives"]:
+                    stat = os.stat(os.path.join(mods_dir, name))
+                    if [stat.st_size, stat.st_mtime_ns] != [size, mtime]:
+                        return False
+        except OSError:
+            return False
+    elif by_content:
+        archives = [[entry.name, entry.size, entry.mtime] for entry in scan.entries]
+        if sorted(archives) != sorted(snapshot["archives"]):
+            return False
+    elif sorted(scan.archives) != sorted(name for name, _, _ in snapshot["archives"]):
+        return False
+
+    if _stat_key(ini_file_path) != snapshot["ini"]:
+        return False
+    if _stat_key(import_ini) != snapshot["import"]:
+        return False
+
+    # Only re-hash the catalog when one of its files was touched
+    try:
+        key = [list(key) for key in _catalog_cache_key(catalog_paths)]
+        if key != snapshot["catalog_key"]:
+            return load_catalog(catalog_paths).digest == snapshot["catalog"]
+    except CatalogError:
+        return False
+    return True
+
+
+def check_archives(scan, classification):
+    """
+    Read the BA2 header of every scanned archive. Returns the Ba2Header
+    records of invalid archives and (name, suggested section) pairs for
+    valid archives that are not in the catalog.
+    """
+    import ba2Archive
+
+    headers = ba2Archive.read_headers(
+        os.path.join(scan.data_dir, entry.name) for entry in scan.entries
+    )
+    unknown = {mod for section in classification.sections for mod in section.other_mods}
+    invalid = [header for header in headers if header.error]
+    # other_mods hold scan names, which keep the subfolder of nested archives
+    suggestions = [
+        (entry.name, ba2Archive.suggest_section(header))
+        for entry, header in zip(scan.entries, headers)
+        if not header.error and entry.name in unknown
+    ]
+    return invalid, suggestions
+
+
+def parse_budget_limit(value):
+    """
+    Parse a --budget-limit of the form SECTION=500MB, SECTION=2GB or
+    SECTION=20000files (a bare number is MB).
+    Returns (section, "size" or "files", limit).
+    """
+    section, _, limit = value.partition("=")
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*", limit.lower())
+    if not section or not match or match.group(2) not in ("", *BUDGET_UNITS):
+        raise argparse.ArgumentTypeError(
+            f"'{value}' is not SECTION=<size>MB, SECTION=<size>GB or SECTION=<n>files"
+        )
+    unit = match.group(2) or "mb"
+    kind = "files" if unit == "files" else "size"
+    return section, kind, int(float(match.group(1)) * BUDGET_UNITS[unit])
+
+
+def budget_limits(limits=()):
+    """
+    DEFAULT_BUDGET_LIMITS overridden by parsed --budget-limit values.
+    """
+    merged = {section: dict(limit) for section, limit in DEFAULT_BUDGET_LIMITS.items()}
+    for section, kind, limit in limits:
+        merged.setdefault(section, {})[kind] = limit
+    return merged
+
+
+def _format_size(size):
+    return f"{size / 1024**2:.1f} MB"
+
+
+def section_budgets(scan, classification, limits=None):
+    """
+    Total the archive sizes and the files inside them (from the BA2 headers)
+    for every section, including the default archives listed in it that are
+    in the data folder. Returns a SectionBudget per section, whose archives
+    are (name, size, file count) tuples, heaviest first, and whose over lists
+    the limits the section exceeds.
+    """
+    import ba2Archive
+
+    if limits is None:
+        limits = budget_limits()
+    sizes = {entry.name: entry.size for entry in scan.entries}
+    listed = [
+        (section, order_section(section, classification.place_last))
+        for section in classification.sections
+    ]
+    paths = [os.path.join(scan.data_dir, mod) for _, mods in listed for mod in mods]
+    headers = iter(ba2Archive.read_headers(paths))
+
+    budgets = []
+    for section, mods in listed:
+        archives = []
+        for mod in mods:
+            header = next(headers)
+            size = sizes.get(mod)
+            if size is None:
+                if header.size is None:
+                    # A default archive that is not in this data folder
+                    continue
+                size = header.size
+            archives.append((mod, size, header.file_count or 0))
+        archives.sort(key=lambda archive: -archive[1])
+        size = sum(archive[1] for archive in archives)
+        file_count = sum(archive[2] for archive in archives)
+
+        over = []
+        limit = limits.get(section.filename, {})
+        if "size" in limit and size > limit["size"]:
+            over.append(f"{_format_size(size)} > {_format_size(limit['size'])}")
+        if "files" in limit and file_count > limit["files"]:
+            over.append(f"{file_count} files > {limit['files']} files")
+        budgets.append(
+            SectionBudget(section.filename, tuple(archives), size, file_count, over)
+        )
+    return budgets
+
+
+def budget_to_dict(budgets, limits):
+    """
+    The section budgets as plain data for --budget-json.
+    """
+    return {
+        "sections": [
+            {
+                "filename": budget.filename,
+                "archives": [
+                    {"name": name, "size": size, "files": files}
+                    for name, size, files in budget.archives
+                ],
+                "size": budget.size,
+                "files": budget.file_count,
+                "limits": limits.get(budget.filename, {}),
+                "over": budget.over,
+            }
+            for budget in budgets
+        ],
+        "size": sum(budget.size for budget in budgets),
+        "files": sum(budget.file_count for budget in budgets),
+    }
+
+
+def find_conflicts(scan, classification, cache_file=None):
+    """
+    Index the name tables of the scanned archives in load order and return
+    a ba2Archive.FileIndex describing which mod wins each overridden asset.
+    """
+    import ba2Archive
+
+    if cache_file is None:
+        cache_file = os.path.join(SCRIPT_DIR, INDEX_CACHE_FILE)
+    paths = [os.path.join(scan.data_dir, mod) for mod in load_order(classification)]
+    return ba2Archive.build_file_index(paths, cache_file)
+
+
+def find_duplicate_archives(scan, trace=NULL_TRACE, cache_file=None):
+    """
+    Group the scanned archives that have identical content. Archives with a
+    size no other archive has are never read.
+    Returns (groups of archive names in scan order, read errors by name).
+    """
+    import archiveHashes
+
+    if cache_file is None:
+        cache_file = os.path.join(SCRIPT_DIR, HASH_CACHE_FILE)
+    files = [
+        (os.path.abspath(os.path.join(scan.data_dir, entry.name)), entry.size)
+        for entry in scan.entries
+    ]
+    names = {path: entry.name for (path, _), entry in zip(files, scan.entries)}
+    found = archiveHashes.find_duplicates(files, cache_file)
+    trace.count("duplicate_edges_read", found.edges_read)
+    trace.count("duplicate_full_hashes", found.hashed)
+    groups = [tuple(names[path] for path in group) for group in found.groups]
+    errors = {names[path]: error for path, error in found.errors.items()}
+    return groups, errors
+
+
+def duplicate_keeper(group, classifier):
+    """
+    The copy of a group of duplicates that stays in the ini: one the catalog
+    knows by name, otherwise the shortest name (renamed copies tend to grow
+    a suffix), then alphabetically.
+    """
+    return min(
+        group,
+        key=lambda name: (
+            name.rpartition("/")[2].casefold() not in classifier.index,
+            len(name),
+            name.casefold(),
+        ),
+    )
+
+
+def skip_duplicates(scan, groups, classifier):
+    """
+    Return a ScanResult with only the duplicate_keeper() of each group.
+    """
+    skipped = set()
+    for group in groups:
+        keeper = duplicate_keeper(group, classifier)
+        skipped.update(name for name in group if name != keeper)
+    return scan._replace(
+        entries=tuple(entry for entry in scan.entries if entry.name not in skipped)
+    )
+
+
+def lock_path_for(ini_file_path):
+    return ini_file_path + LOCK_SUFFIX
+
+
+def hash_archives(scan, trace=NULL_TRACE, cache_file=None):
+    """
+    Hash every scanned archive across a thread pool, reading only archives
+    whose size or mtime changed since they were last hashed.
+    Returns an archiveHashes.FileHashes keyed by absolute path.
+    """
+    import archiveHashes
+
+    if cache_file is None:
+        cache_file = os.path.join(SCRIPT_DIR, HASH_CACHE_FILE)
+    hashes = archiveHashes.hash_files(
+        (os.path.join(scan.data_dir, entry.name) for entry in scan.entries),
+        cache_file,
+    )
+    trace.count("archives_hashed", hashes.hashed)
+    return hashes
+
+
+def _ini_digest(ini_file_path):
+    import archiveHashes
+
+    try:
+        return archiveHashes.hash_file(ini_file_path)
+    except OSError:
+        return None
+
+
+def make_lock(scan, classification, hashes, ini_file_path):
+    """
+    Record exactly which archives went into an ini: name, size, mtime,
+    content hash and section of each archive in load order, plus the hash
+    of the ini itself.
+    """
+    import archiveHashes
+
+    sections = {
+        mod: section.filename
+        for section in classification.sections
+        for mod in section.found_mods
+    }
+    entries = {entry.name: entry for entry in scan.entries}
+    archives = []
+    for name in load_order(classification):
+        entry = entries[name]
+        path = os.path.abspath(os.path.join(scan.data_dir, name))
+        archives.append(
+            {
+                "name": name,
+                "size": entry.size,
+                "mtime": entry.mtime,
+                "hash": hashes.digests.get(path),
+                "section": sections[name],
+            }
+        )
+    return {
+        "version": LOCK_VERSION,
+        "algorithm": archiveHashes.ALGORITHM,
+        "data_dir": os.path.abspath(scan.data_dir),
+        "ini": {
+            "name": os.path.basename(ini_file_path),
+            "hash": _ini_digest(ini_file_path),
+        },
+        "archives": archives,
+    }
+
+
+def load_lock(lock_path):
+    """
+    Read a saved lockfile, returns None if there is no usable one.
+    """
+    try:
+        with open(lock_path, "r", encoding="utf-8") as f:
+            lock = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(lock, dict) or lock.get("version") != LOCK_VERSION:
+        return None
+    return lock
+
+
+def save_lock(lock_path, lock):
+    replace_file(lock_path, [json.dumps(lock, indent=2).encode("utf-8")])
+
+
+def verify_lock(lock, scan, classification, hashes, ini_file_path):
+    """
+    Compare the current data folder with a lockfile. Returns a Drift for
+    every archive that was added, removed, modified, moved to another
+    section or could not be read, and for an ini that changed since it was
+    locked. An empty list means nothing drifted.
+    """
+    drift = []
+    sections = {
+        mod: section.filename
+        for section in classification.sections
+        for mod in section.found_mods
+    }
+    locked = {archive["name"]: archive for archive in lock["archives"]}
+
+    for name in load_order(classification):
+        path = os.path.abspath(os.path.join(scan.data_dir, name))
+        archive = locked.get(name)
+        if path in hashes.errors:
+            drift.append(Drift("unreadable", name, hashes.errors[path]))
+        if archive is None:
+            drift.append(Drift("added", name, sections[name]))
+            continue
+        digest = hashes.digests.get(path)
+        if digest is not None and digest != archive["hash"]:
+            drift.append(Drift("modified", name, "content hash differs"))
+        if sections[name] != archive["section"]:
+            drift.append(
+                Drift("section", name, f"{archive['section']} -> {sections[name]}")
+            )
+    for name, archive in locked.items():
+        if name not in sections:
+            drift.append(Drift("removed", name, archive["section"]))
+
+    ini_digest = _ini_digest(ini_file_path)
+    if ini_digest != lock["ini"]["hash"]:
+        detail = "missing" if ini_digest is None else "changed since it was locked"
+        drift.append(Drift("ini", os.path.basename(ini_file_path), detail))
+    return drift
+
+
+def build_parser():
+    """
+    Build the command line parser. The ini folder default is resolved in main()
+    so that building the parser never probes the file system.
+    """
+    parser = argparse.ArgumentParser(
+        description="This program will automatically create the "
+        "Fallout76Custom.ini file for you. In most cases the "
+        "default arguments will be fine."
+    )
+    parser.add_argument(
+        "--datafolder",
+        default=".",
+        help="Specify Fallout 76's data folder location (Default: current directory)",
+    )
+    parser.add_argument(
+        "--inifolder",
+        default=None,
+        help="Specify the folder where Fallout76Custom.ini lives "
+        "(Default: auto-detected from Documents or OneDrive)",
+    )
+    parser.add_argument(
+        "--inifilename",
+        default=FILENAME,
+        help="Specify the filename for the ini (Default: {})".format(FILENAME),
+    )
+    parser.add_argument(
+        "--runasadmin",
+        action="store_true",
+        help="Runs as an admin. Use when Fallout 76 is installed in UAC location.",
+    )
+    parser.add_argument(
+        "--copyinicontents", help="Copy a file's contents into your custom .ini"
+    )
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Also look for archives in subfolders of the data folder",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=DEFAULT_MAX_DEPTH,
+        help="How many subfolder levels --recursive reads "
+        "(Default: {})".format(DEFAULT_MAX_DEPTH),
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="Skip files and folders matching this glob during --recursive "
+        "scans (can be repeated)",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Only replace the sResource* keys of an existing ini, keeping "
+        "everything else in it as is",
+    )
+    parser.add_argument(
+        "--duplicates",
+        action="store_true",
+        help="Report archives that have the same content under different names",
+    )
+    parser.add_argument(
+        "--skip-duplicates",
+        action="store_true",
+        help="Like --duplicates, and only write one copy of each to the ini",
+    )
+    parser.add_argument(
+        "--budget",
+        action="store_true",
+        help="Report the archive size and file count of each ini section and "
+        "flag sections over their limit",
+    )
+    parser.add_argument(
+        "--budget-limit",
+        action="append",
+        default=[],
+        type=parse_budget_limit,
+        metavar="SECTION=LIMIT",
+        help="Flag a section over this size (500MB, 2GB) or file count "
+        "(20000files), implies --budget (can be repeated, Default: "
+        "sResourceStartUpArchiveList=512MB)",
+    )
+    parser.add_argument(
+        "--budget-json",
+        help="Write the --budget report to this JSON file, implies --budget",
+    )
+    parser.add_argument(
+        "--lock",
+        action="store_true",
+        help="Also write a lockfile next to the ini with the name, size, mtime, "
+        "content hash and section of every archive",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Compare the data folder with the lockfile next to the ini and "
+        "report what drifted, without writing the ini",
+    )
+    parser.add_argument(
+        "--catalog",
+        action="append",
+        default=[],
+        help="Layer an extra mod catalog file over {} (can be repeated)".format(
+            CATALOG_FILE
+        ),
+    )
+    parser.add_argument(
+        "--if-changed",
+        action="store_true",
+        help="Only regenerate the ini when the mods, the catalog or the import "
+        "file changed since the last run",
+    )
+    parser.add_argument(
+        "--profiles",
+        help="Generate every profile in this JSON file from a single scan "
+        "instead of one ini",
+    )
+    parser.add_argument(
+        "--fleet",
+        help="Generate the ini of every install in this JSON manifest at once "
+        "instead of one data folder",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=FLEET_WORKERS,
+        help="Installs generated at the same time in --fleet mode "
+        "(Default: {})".format(FLEET_WORKERS),
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and regenerate the ini whenever .ba2 files are "
+        "added, removed or renamed in the data folder",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        help="Seconds to wait for a burst of changes to settle in --watch mode "
+        "(Default: 2)",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keep running and answer scan/preview/generate requests over "
+        "JSON-RPC on 127.0.0.1",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=7676,
+        help="Port for --serve, 0 picks a free one (Default: 7676)",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print how long each phase took and what was counted",
+    )
+    parser.add_argument(
+        "--trace-file",
+        help="Write the phase timings and counters to this JSON file",
+    )
+    parser.add_argument(
+        "--check-archives",
+        action="store_true",
+        help="Read each archive's BA2 header, report corrupt archives and "
+        "suggest sections for mods that are not in the catalog",
+    )
+    parser.add_argument(
+        "--conflicts",
+        action="store_true",
+        help="Report assets that are in more than one mod and which mod wins",
+    )
+    return parser
+
+
+def output_options(args):
+    """
+    The command line options, other than the inputs, that change the
+    written ini. They are part of the --if-changed snapshot.
+    """
+    return {"update": args.update, "skip_duplicates": args.skip_duplicates}
+
+
+def walk_options(args):
+    """
+    The WalkOptions for --recursive, None for a flat scan.
+    """
+    if not args.recursive:
+        return None
+    return WalkOptions(args.max_depth, tuple(args.exclude))
+
+
+def report_budget(args, scan, classification):
+    """
+    Print the section budgets for --budget and write them to --budget-json.
+    """
+    limits = budget_limits(args.budget_limit)
+    budgets = section_budgets(scan, classification, limits)
+    sections = {section.filename for section in classification.sections}
+    for section in limits.keys() - sections:
+        print(f"Warning: --budget-limit names an unknown section '{section}'")
+    print("Section budget:")
+    print(f"  {'section':<28} {'archives':>8} {'size':>12} {'files':>9}")
+    for budget in budgets:
+        print(
+            f"  {budget.filename:<28} {len(budget.archives):>8} "
+            f"{_format_size(budget.size):>12} {budget.file_count:>9}"
+        )
+    for budget in budgets:
+        if budget.over:
+            heaviest = ", ".join(
+                f"{name} ({_format_size(size)})"
+                for name, size, _ in budget.archives[:3]
+            )
+            print(
+                f"Warning: {budget.filename} is over budget "
+                f"({'; '.join(budget.over)}), heaviest: {heaviest}"
+            )
+    if args.budget_json:
+        try:
+            with open(args.budget_json, "w", encoding="utf-8") as f:
+                json.dump(budget_to_dict(budgets, limits), f, indent=2)
+        except OSError as e:
+            print(f"Warning: could not write budget file '{args.budget_json}': {e}")
+
+
+def report_duplicates(args, scan, catalog, trace=NULL_TRACE):
+    """
+    Print the duplicate archives for --duplicates and --skip-duplicates.
+    Returns the scan to write the ini from, without the skipped copies.
+    """
+    if not (args.duplicates or args.skip_duplicates):
+        return scan
+    with trace.phase("duplicates"):
+        groups, errors = find_duplicate_archives(scan, trace)
+    for name, error in errors.items():
+        print(f"Warning: could not read '{name}': {error}")
+    for group in groups:
+        keeper = duplicate_keeper(group, catalog.classifier)
+        copies = [f"'{name}'" for name in group if name != keeper]
+        verb = "has" if len(copies) == 1 else "have"
+        action = "skipped" if args.skip_duplicates else "still loaded"
+        print(
+            f"Duplicate: {', '.join(copies)} {verb} the same content as "
+            f"'{keeper}' ({action})"
+        )
+    if not args.skip_duplicates:
+        return scan
+    return skip_duplicates(scan, groups, catalog.classifier)
+
+
+def run_once(
+    args,
+    mods_dir,
+    ini_file_path,
+    catalog,
+    catalog_paths,
+    snapshot=None,
+    trace=NULL_TRACE,
+):
+    """
+    Scan, classify and write once for the command line, printing progress.
+    With a snapshot (--if-changed) nothing is written when no mod changed.
+    Returns the process exit code.
+    """
+    import_ini = args.copyinicontents
+    walk = walk_options(args)
+    options = output_options(args)
+    snapshot_path = snapshot_path_for(ini_file_path)
+
+    print(f"Scanning for mods in: {mods_dir}")
+
+    try:
+        with trace.phase("scan"):
+            scan = scan_data_folder(mods_dir, trace, walk=walk)
+        if snapshot and snapshot_is_current(
+            snapshot,
+            mods_dir,
+            ini_file_path,
+            catalog_paths,
+            import_ini,
+            scan,
+            walk,
+            options,
+        ):
+            save_snapshot(
+                snapshot_path,
+                make_snapshot(
+                    scan, catalog, ini_file_path, import_ini, walk, options
+                ),
+            )
+            print(f"No mods changed, {ini_file_path} is up to date")
+            return 0
+
+        ini_scan = report_duplicates(args, scan, catalog, trace)
+        print(f"Creating ini file at: {ini_file_path}")
+        with trace.phase("classify"):
+            classification = classify_mods(ini_scan.archives, catalog.classifier)
+        trace.record_classification(classification)
+        if args.check_archives:
+            with trace.phase("check_archives"):
+                invalid, suggestions = check_archives(scan, classification)
+            for header in invalid:
+                rel = os.path.relpath(header.path, scan.data_dir)
+                name = rel.replace(os.sep, "/")
+                print(f"Warning: '{name}' is not a valid BA2 archive: {header.error}")
+            for name, section in suggestions:
+                print(f"Not in the catalog: '{name}' probably belongs in {section}")
+        if args.conflicts:
+            with trace.phase("conflicts"):
+                file_index = find_conflicts(scan, classification)
+            for path, error in file_index.errors.items():
+                name = os.path.basename(path)
+                print(f"Warning: could not index '{name}': {error}")
+            print(
+                f"Conflicts: {len(file_index.conflicts)} of {file_index.file_count} "
+                "assets are in more than one mod"
+            )
+            for winner, loser, count in file_index.conflict_summary():
+                print(f"  {winner} overrides {loser} ({count} files)")
+        if args.budget or args.budget_limit or args.budget_json:
+            with trace.phase("budget"):
+                report_budget(args, ini_scan, classification)
+        with trace.phase("render"):
+            content = render_ini(classification)
+        with trace.phase("write"):
+            if args.update:
+                managed = [section.filename for section in classification.sections]
+                write = update_ini(ini_file_path, content, managed)
             else:
-                print(f"Warning: Import file '{import_ini}' not found!")
+                write = write_ini(ini_file_path, content, import_ini)
+        trace.record_write(write)
+        if args.if_changed:
+            save_snapshot(
+                snapshot_path,
+                make_snapshot(
+                    scan, catalog, ini_file_path, import_ini, walk, options
+                ),
+            )
+        if args.lock:
+            with trace.phase("lock"):
+                hashes = hash_archives(scan, trace)
+                lock = make_lock(scan, classification, hashes, ini_file_path)
+                save_lock(lock_path_for(ini_file_path), lock)
+            for path, error in hashes.errors.items():
+                print(f"Warning: could not hash '{os.path.basename(path)}': {error}")
+    except PermissionError:
+        print(
+            f"Error: Permission denied writing to '{ini_file_path}'. Try running with --runasadmin"
+        )
+        return 1
+    except Exception as e:
+        print(f"Error creating ini file: {e}")
+        return 1
+
+    if write.imported:
+        print(f"Imported contents from: {import_ini}")
+    elif write.imported is False:
+        print(f"Warning: Import file '{import_ini}' not found!")
+
+    if write.changed:
+        print(f"Successfully {'updated' if args.update else 'created'} {ini_file_path}")
+    else:
+        print(f"{ini_file_path} is already up to date, left it untouched")
+    if args.lock:
+        locked = len(lock["archives"])
+        print(f"Locked {locked} archives in {lock_path_for(ini_file_path)}")
+    return 0
+
+
+def run_verify(args, mods_dir, ini_file_path, catalog, trace=NULL_TRACE):
+    """
+    Check the data folder against the lockfile of the ini for the command
+    line and print every drift. Returns 1 when anything drifted.
+    """
+    lock_path = lock_path_for(ini_file_path)
+    lock = load_lock(lock_path)
+    if lock is None:
+        print(f"Error: No lockfile at '{lock_path}', create one with --lock")
+        return 1
+
+    print(f"Verifying {mods_dir} against {lock_path}")
+    try:
+        with trace.phase("scan"):
+            scan = scan_data_folder(mods_dir, trace, walk=walk_options(args))
+    except OSError as e:
+        print(f"Error scanning mods: {e}")
+        return 1
+    ini_scan = report_duplicates(args, scan, catalog, trace)
+    with trace.phase("classify"):
+        classification = classify_mods(ini_scan.archives, catalog.classifier)
+    with trace.phase("hash"):
+        hashes = hash_archives(scan, trace)
+    with trace.phase("verify"):
+        drift = verify_lock(lock, scan, classification, hashes, ini_file_path)
+
+    for item in drift:
+        print(f"  {item.kind:<10} {item.name}: {item.detail}")
+    if drift:
+        print(f"{len(drift)} differences from the lockfile")
+        return 1
+    print(f"No drift, all {len(lock['archives'])} archives match the lockfile")
+    return 0
+
+
+def run_profiles(args, mods_dir, ini_folder, catalog, trace=NULL_TRACE):
+    """
+    Scan once and write every profile in args.profiles for the command line.
+    Returns the process exit code.
+    """
+    try:
+        profiles = load_profiles(args.profiles, ini_folder)
+    except ProfileError as e:
+        print(f"Error loading profiles: {e}")
+        return 1
+
+    print(f"Scanning for mods in: {mods_dir}")
+    try:
+        with trace.phase("scan"):
+            scan = scan_data_folder(mods_dir, trace, walk=walk_options(args))
+    except OSError as e:
+        print(f"Error scanning mods: {e}")
+        return 1
+
+    with trace.phase("profiles"):
+        results = generate_profiles(scan, profiles, catalog)
+
+    status = 0
+    for result in results:
+        profile = result.profile
+        if result.write:
+            trace.record_write(result.write)
+        if result.error:
+            status = 1
+            print(f"[{profile.name}] Error creating {profile.output}: {result.error}")
+        elif result.write.changed:
+            total = result.classification.total
+            print(
+                f"[{profile.name}] Successfully created {profile.output} ({total} mods)"
+            )
+        else:
+            print(f"[{profile.name}] {profile.output} is already up to date")
+    return status
+
+
+def run_fleet(args, ini_folder, catalog_paths, trace=NULL_TRACE):
+    """
+    Generate every install in args.fleet for the command line and print a
+    summary with the status and timings of each one.
+    Returns the process exit code.
+    """
+    try:
+        installs = load_fleet(args.fleet, ini_folder, args.update)
+    except FleetError as e:
+        print(f"Error loading fleet manifest: {e}")
+        return 1
 
-    print(f"Successfully created {ini_file_path}")
+    try:
+        with trace.phase("catalog"):
+            catalog = load_catalog(catalog_paths)
+    except CatalogError as e:
+        print(f"Error loading mod catalog: {e}")
+        return 1
 
-except PermissionError:
+    jobs = min(args.jobs, len(installs))
+    print(f"Generating {len(installs)} installs, {jobs} at a time")
+    with trace.phase("fleet"):
+        results = generate_fleet(installs, catalog, walk_options(args), jobs)
+
+    status = 0
+    width = max(len(result.install.name) for result in results)
     print(
-        f"Error: Permission denied writing to '{ini_file_path}'. Try running with --runasadmin"
+        f"{'install':<{width}}  {'status':<10} {'mods':>6} {'scan':>10} {'total':>10}"
+    )
+    for result in results:
+        install = result.install
+        phases = dict(result.trace.phases)
+        total = sum(phases.values())
+        if result.write:
+            trace.record_write(result.write)
+        if result.error:
+            status = 1
+            state = "error"
+        elif result.write.changed:
+            state = "updated" if install.update else "created"
+        else:
+            state = "unchanged"
+        mods = result.classification.total if result.classification else "-"
+        print(
+            f"{install.name:<{width}}  {state:<10} {mods:>6} "
+            f"{phases.get('scan', 0) * 1000:7.1f} ms {total * 1000:7.1f} ms"
+        )
+        if result.error:
+            print(f"{'':<{width}}  {install.ini_file}: {result.error}")
+    failed = sum(1 for result in results if result.error)
+    print(f"{len(results) - failed} of {len(results)} installs generated")
+    return status
+
+
+def finish_trace(args, trace):
+    """
+    Print and save a trace as asked for by --timings and --trace-file.
+    """
+    if args.timings:
+        print("\n".join(trace.report()))
+    if args.trace_file:
+        try:
+            trace.save(args.trace_file)
+        except OSError as e:
+            print(f"Warning: could not write trace file '{args.trace_file}': {e}")
+
+
+def main(argv=None):
+    """
+    Command line entry point. Returns the process exit code.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.update and (args.copyinicontents or args.profiles):
+        parser.error("--update can't be combined with --copyinicontents or --profiles")
+    if args.fleet and (
+        args.copyinicontents
+        or args.profiles
+        or args.if_changed
+        or args.watch
+        or args.serve
+    ):
+        parser.error(
+            "--fleet can't be combined with --copyinicontents, --profiles, "
+            "--if-changed, --watch or --serve"
+        )
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.recursive and args.watch:
+        # FolderWatcher only sees the data folder itself, not its subfolders
+        parser.error("--recursive can't be combined with --watch")
+    if args.verify and (
+        args.lock or args.profiles or args.fleet or args.watch or args.serve
+    ):
+        parser.error(
+            "--verify can't be combined with --lock, --profiles, --fleet, "
+            "--watch or --serve"
+        )
+    if args.lock and (args.profiles or args.fleet):
+        parser.error("--lock can't be combined with --profiles or --fleet")
+    reports = (
+        args.duplicates
+        or args.skip_duplicates
+        or args.budget
+        or args.budget_limit
+        or args.budget_json
+        or args.check_archives
+        or args.conflicts
     )
-    sys.exit(1)
-except Exception as e:
-    print(f"Error creating ini file: {e}")
-    sys.exit(1)
+    if reports and (args.profiles or args.fleet or args.serve):
+        # Only the single ini run prints reports or skips duplicates
+        parser.error(
+            "--duplicates, --skip-duplicates, --budget, --check-archives and "
+            "--conflicts can't be combined with --profiles, --fleet or --serve"
+        )
+
+    # Re-run the program with admin rights if needed
+    if args.runasadmin:
+        ctypes.windll.shell32.ShellExecuteW(
+            None, "runas", sys.executable, __file__, None, 1
+        )
+        return 0
+
+    def new_trace():
+        return Trace() if args.timings or args.trace_file else NULL_TRACE
+
+    trace = new_trace()
+
+    # Assign arguments to variables
+    mods_dir = args.datafolder
+    with trace.phase("detect"):
+        ini_folder = args.inifolder or find_fallout76_directory(log=print)
+    ini_file_path = os.path.join(ini_folder, args.inifilename)
+    import_ini = args.copyinicontents
+
+    catalog_paths = default_catalog_paths() + args.catalog
+    snapshot_path = snapshot_path_for(ini_file_path)
+
+    if args.fleet:
+        status = run_fleet(args, ini_folder, catalog_paths, trace)
+        finish_trace(args, trace)
+        return status
+
+    # Validate that the data folder exists
+    if not os.path.exists(mods_dir):
+        print(f"Error: Data folder '{mods_dir}' does not exist!")
+        return 1
+
+    if args.serve:
+        try:
+            from rpcServer import serve
+        except ImportError as e:
+            print(f"Error: --serve needs rpcServer.py next to this script ({e})")
+            return 1
+
+        # Flushed right away, clients wait for the address line
+        return serve(
+            mods_dir,
+            ini_file_path,
+            catalog_paths,
+            args.port,
+            log=lambda message: print(message, flush=True),
+            walk=walk_options(args),
+        )
+
+    # Profiles always regenerate, --if-changed only covers the single ini
+    # A missing lockfile has to be written even when no mod changed
+    lock_missing = args.lock and not os.path.exists(lock_path_for(ini_file_path))
+    snapshot = None
+    up_to_date = False
+    if args.if_changed and not args.profiles and not args.verify and not lock_missing:
+        with trace.phase("snapshot"):
+            snapshot = load_snapshot(snapshot_path)
+            up_to_date = snapshot and snapshot_is_current(
+                snapshot,
+                mods_dir,
+                ini_file_path,
+                catalog_paths,
+                import_ini,
+                walk=walk_options(args),
+                options=output_options(args),
+            )
+    if up_to_date:
+        print(f"No changes since the last run, {ini_file_path} is up to date")
+        finish_trace(args, trace)
+        if not args.watch:
+            return 0
+
+    try:
+        with trace.phase("catalog"):
+            catalog = load_catalog(catalog_paths)
+    except CatalogError as e:
+        print(f"Error loading mod catalog: {e}")
+        return 1
+
+    if args.verify:
+        status = run_verify(args, mods_dir, ini_file_path, catalog, trace)
+        finish_trace(args, trace)
+        return status
+
+    def regenerate(trace=None, snapshot=None):
+        if trace is None:
+            trace = new_trace()
+        if args.profiles:
+            status = run_profiles(args, mods_dir, ini_folder, catalog, trace)
+        else:
+            status = run_once(
+                args, mods_dir, ini_file_path, catalog, catalog_paths, snapshot, trace
+            )
+        finish_trace(args, trace)
+        return status
+
+    if not up_to_date:
+        status = regenerate(trace, snapshot)
+        if not args.watch:
+            return status
+
+    try:
+        from folderWatcher import FolderWatcher
+    except ImportError as e:
+        print(f"Error: --watch needs folderWatcher.py next to this script ({e})")
+        return 1
+
+    print(f"Watching {mods_dir} for mod changes, press Ctrl+C to stop")
+    watcher = FolderWatcher(
+        mods_dir, regenerate, accept=is_mod_archive, debounce=args.debounce
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
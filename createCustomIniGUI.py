@@ -2,111 +2,105 @@
 GUI version of createCustomIni - Creates a fallout76Custom.ini file from installed mods
 """
 
+import time
+
+# Taken before the heavier imports so the startup time covers them
+STARTUP_TIME = time.perf_counter()
+
+import json
 import os
+import queue
 import sys
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
-import json
-import subprocess
-from tkinterdnd2 import DND_FILES, TkinterDnD
+from collections import deque
 
 # Import the core logic from the original script
-FILENAME = "Fallout76Custom.ini"
-
+from createCustomIni import (
+    FILENAME,
+    find_fallout76_directory,
+    is_mod_archive,
+    scan_data_folder,
+    scan_is_current,
+    ScanCancelled,
+    classify_mods,
+    render_ini,
+    write_ini,
+    update_ini,
+    Trace,
+    NULL_TRACE,
+)
 
-def find_fallout76_directory():
-    """Find the Fallout 76 directory by checking multiple possible locations."""
-    user_home = os.path.expanduser("~")
-    
-    possible_paths = [
-        os.path.join(user_home, "OneDrive", "Documents", "My Games", "Fallout 76"),
-        os.path.join(user_home, "Documents", "My Games", "Fallout 76"),
-        os.path.join(user_home, "OneDrive - Personal", "Documents", "My Games", "Fallout 76"),
-        os.path.join(user_home, "OneDrive", "My Games", "Fallout 76"),
-        os.path.join(user_home, "OneDrive - Business", "Documents", "My Games", "Fallout 76"),
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            return path
-    
-    return os.path.join(user_home, "Documents", "My Games", "Fallout 76")
+SETTINGS_FILE = "createCustomIni_settings.json"
 
+# How often the main loop picks up scan results from worker threads
+SCAN_POLL_MS = 50
+# Time the preview may spend inserting rows before giving a frame back
+TREE_SLICE_SECONDS = 0.008
+# Sections with more mods start collapsed and are filled when expanded
+LAZY_SECTION_ROWS = 500
+# The output log is written at most this often and keeps this many lines
+LOG_FLUSH_MS = 100
+LOG_MAX_LINES = 2000
+# The watcher follows the Data Folder entry once typing pauses this long
+WATCH_RESTART_MS = 500
 
-RESOURCE_MAP = [
-    {
-        "filename": "sResourceStartUpArchiveList",
-        "mods": [
-            "BakaFile - Main.ba2",
-            "IconTag.ba2",
-            "IconSortingRatmonkeys.ba2",
-            "MMM - Country Roads.ba2",
-            "ImpUlt.ba2",
-            "Quizzless Apalachia.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-    {
-        "filename": "sResourceArchiveList2",
-        "mods": [
-            "PerkLoadoutManager.ba2",
-            "IUMesh.ba2",
-            "MoreWhereThatCameFrom.ba2",
-            "Prismatic_Lasers_76_Lightblue.ba2",
-            "OptimizedSonar.ba2",
-            "Silentchameleon.ba2",
-            "CleanPip.ba2",
-            "classicFOmus_76.ba2",
-            "nootnoot.ba2",
-            "MenuMusicReplacer.ba2",
-            "BullBarrel.ba2",
-            "EVB76NevernudeFemale - Meshes.ba2",
-            "EVB76NevernudeFemale - Textures.ba2",
-            "EVB76NevernudeMale - Meshes.ba2",
-            "EVB76NevernudeMale - Textures.ba2",
-            "EVB76 - Meshes.ba2",
-            "EVB76 - Textures.ba2",
-            "EVB76Nevernude - Meshes.ba2",
-            "EVB76Nevernude - Textures.ba2",
-            "BoxerShorts.ba2",
-            "MaleUnderwear.ba2",
-            "FemaleUnderwear.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-    {
-        "filename": "sResourceIndexFileList",
-        "mods": [
-            "UHDmap.ba2",
-            "EnhancedBlood - Textures.ba2",
-            "EnhancedBlood - Meshes.ba2",
-            "MapMarkers.ba2",
-            "Radiant_Clouds.ba2",
-            "SpoilerFreeMap.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-    {
-        "filename": "sResourceArchive2List",
-        "mods": [
-            "PerkLoadoutManager.ba2",
-            "ChatMod.ba2",
-            "ShowHealthReRedux.ba2",
-            "ShowHealth.ba2",
-            "CompatibleShowHealthRedux.ba2",
-        ],
-        "default_mods": [],
-        "found_mods": [],
-    },
-]
 
-SR_2LIST_INDEX = 3
-MOD_TO_PLACE_LAST = "HUDModLoader.ba2"
-SETTINGS_FILE = "createCustomIni_settings.json"
+class LogSink:
+    """
+    Collects log messages from any thread and writes them to a text widget in
+    batches from the main loop, keeping at most max_lines lines in it.
+    """
+    
+    def __init__(self, root, widget, interval_ms=LOG_FLUSH_MS, max_lines=LOG_MAX_LINES):
+        self.root = root
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.max_lines = max_lines
+        # deque.append and popleft are atomic, writers never wait on the main loop
+        self.pending = deque()
+        
+    def write(self, message):
+        self.pending.append(message)
+        
+    def clear(self):
+        # None clears everything written before it
+        self.pending.append(None)
+        
+    def start(self):
+        self.flush()
+        self.root.after(self.interval_ms, self.start)
+        
+    def flush(self):
+        """Write everything pending in one insert. Main thread only."""
+        messages = []
+        clear = False
+        while True:
+            try:
+                message = self.pending.popleft()
+            except IndexError:
+                break
+            if message is None:
+                messages.clear()
+                clear = True
+            else:
+                messages.append(message)
+        if not messages and not clear:
+            return
+        
+        widget = self.widget
+        widget.config(state='normal')
+        if clear:
+            widget.delete('1.0', tk.END)
+        if messages:
+            widget.insert(tk.END, "\n".join(messages[-self.max_lines:]) + "\n")
+            # 'end-1c' sits on the empty line after the last message
+            lines = int(widget.index('end-1c').split('.')[0]) - 1
+            if lines > self.max_lines:
+                widget.delete('1.0', f'{lines - self.max_lines + 1}.0')
+            widget.see(tk.END)
+        widget.config(state='disabled')
 
 
 class CreateCustomIniGUI:
@@ -118,27 +112,87 @@ class CreateCustomIniGUI:
         
         # Variables
         self.data_folder = tk.StringVar(value=".")
-        self.ini_folder = tk.StringVar(value=find_fallout76_directory())
+        # Filled in by the background detection unless settings provide it
+        self.ini_folder = tk.StringVar(value="")
+        self.detected_ini_folder = None
         self.ini_filename = tk.StringVar(value=FILENAME)
         self.import_ini = tk.StringVar(value="")
         self.dark_mode = tk.BooleanVar(value=False)
         self.mod_count = tk.StringVar(value="Mods found: 0")
+        self.watch_mods = tk.BooleanVar(value=False)
+        self.show_timings = tk.BooleanVar(value=False)
+        self.update_in_place = tk.BooleanVar(value=False)
         self.last_created_path = None
+        self.watcher = None
+        self.watch_restart = None
+        
+        # Latest scan of each data folder, shared by Scan Mods and Create
+        self.scan_cache = {}
+        # Set to stop the running Scan Mods scan when a new one starts
+        self.scan_cancel = threading.Event()
+        # Scan workers queue (status, classification) here, the main loop drains it
+        self.scan_results = queue.Queue()
+        # Preview state: the sorted mods of each section from the latest scan,
+        # the rows actually shown (absent while a section is still collapsed)
+        # and the row updates still to do
+        self.tree_wanted = {}
+        self.tree_shown = {}
+        self.tree_jobs = deque()
+        self.tree_after = None
         
         # Load saved settings
         self.load_settings()
         
-        # Setup drag and drop
-        self.setup_drag_drop()
-        
         # Trace variables for validation
         self.data_folder.trace_add('write', self.validate_paths)
+        self.data_folder.trace_add('write', self.restart_watch)
         self.ini_folder.trace_add('write', self.validate_paths)
         
         self.create_widgets()
         self.apply_theme()
         self.validate_paths()
         
+        # Idle callbacks queued before mainloop run before the window is even
+        # drawn, so wait for the window to be exposed
+        self.root.bind('<Expose>', self._on_first_expose)
+        self.root.after(SCAN_POLL_MS, self._poll_scan_results)
+        self.log_sink.start()
+        
+    def _on_first_expose(self, event):
+        """Run on_first_frame once the redraws of the first Expose are done"""
+        self.root.unbind('<Expose>')
+        # Those redraws run in the current idle pass, a callback queued from
+        # inside that pass waits for the next one
+        self.root.after_idle(self.root.after_idle, self.on_first_frame)
+        
+    def on_first_frame(self):
+        """Report the startup time, then do the work that can wait for the window"""
+        self.startup_ms = (time.perf_counter() - STARTUP_TIME) * 1000
+        self.log(f"Window ready in {self.startup_ms:.0f} ms")
+        
+        self.setup_drag_drop()
+        threading.Thread(target=self._detect_ini_folder_thread, daemon=True).start()
+        
+    def _detect_ini_folder_thread(self):
+        """
+        Find the Fallout 76 directory once, off the main thread: probing
+        OneDrive placeholder folders can block. A remembered result is only
+        re-checked, the full search runs when it has gone away.
+        """
+        cached = self.detected_ini_folder
+        if cached and os.path.isdir(cached):
+            detected = cached
+        else:
+            detected = find_fallout76_directory()
+        self.root.after(0, lambda: self._apply_detected_ini_folder(detected))
+        
+    def _apply_detected_ini_folder(self, detected):
+        if not self.ini_folder.get():
+            self.ini_folder.set(detected)
+        if detected != self.detected_ini_folder:
+            self.detected_ini_folder = detected
+            self.save_detected_ini_folder()
+        
     def create_widgets(self):
         # Main frame with padding
         main_frame = ttk.Frame(self.root, padding="10")
@@ -156,6 +210,12 @@ class CreateCustomIniGUI:
         ttk.Checkbutton(toolbar, text="Dark Mode", variable=self.dark_mode, 
                        command=self.apply_theme).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Save Settings", command=self.save_settings).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(toolbar, text="Watch Data Folder", variable=self.watch_mods,
+                       command=self.toggle_watch).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(toolbar, text="Show Timings",
+                       variable=self.show_timings).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(toolbar, text="Update Existing INI",
+                       variable=self.update_in_place).pack(side=tk.LEFT, padx=5)
         
         # Data Folder with validation indicator
         row = 1
@@ -221,6 +281,7 @@ class CreateCustomIniGUI:
         
         self.mod_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.mod_tree.bind('<<TreeviewOpen>>', self.on_section_open)
         
         # Tab 2: Output Log
         output_frame = ttk.Frame(self.notebook)
@@ -228,6 +289,7 @@ class CreateCustomIniGUI:
         
         self.output_text = scrolledtext.ScrolledText(output_frame, height=12, width=70, state='disabled')
         self.output_text.pack(fill=tk.BOTH, expand=True)
+        self.log_sink = LogSink(self.root, self.output_text)
         
         # Button frame
         row += 1
@@ -247,9 +309,13 @@ class CreateCustomIniGUI:
     def setup_drag_drop(self):
         """Setup drag and drop for folder entries"""
         try:
-            self.root.drop_target_register(DND_FILES)
-            self.root.dnd_bind('<<Drop>>', self.on_drop)
-        except:
+            # Loaded after the window is up, tkdnd is only needed once a folder is dropped
+            from tkinterdnd2 import DND_FILES, TkinterDnD
+            TkinterDnD._require(self.root)
+            for entry in (self.data_entry, self.ini_entry):
+                entry.drop_target_register(DND_FILES)
+                entry.dnd_bind('<<Drop>>', self.on_drop)
+        except Exception:
             # tkinterdnd2 not available, drag and drop disabled
             pass
     
@@ -286,11 +352,14 @@ class CreateCustomIniGUI:
             if os.path.exists(SETTINGS_FILE):
                 with open(SETTINGS_FILE, 'r') as f:
                     settings = json.load(f)
+                    self.detected_ini_folder = settings.get('detected_ini_folder')
                     self.data_folder.set(settings.get('data_folder', '.'))
-                    self.ini_folder.set(settings.get('ini_folder', find_fallout76_directory()))
+                    self.ini_folder.set(settings.get('ini_folder', self.detected_ini_folder or ''))
                     self.ini_filename.set(settings.get('ini_filename', FILENAME))
                     self.import_ini.set(settings.get('import_ini', ''))
                     self.dark_mode.set(settings.get('dark_mode', False))
+                    self.show_timings.set(settings.get('show_timings', False))
+                    self.update_in_place.set(settings.get('update_in_place', False))
         except Exception as e:
             print(f"Could not load settings: {e}")
     
@@ -302,7 +371,10 @@ class CreateCustomIniGUI:
                 'ini_folder': self.ini_folder.get(),
                 'ini_filename': self.ini_filename.get(),
                 'import_ini': self.import_ini.get(),
-                'dark_mode': self.dark_mode.get()
+                'dark_mode': self.dark_mode.get(),
+                'show_timings': self.show_timings.get(),
+                'update_in_place': self.update_in_place.get(),
+                'detected_ini_folder': self.detected_ini_folder
             }
             with open(SETTINGS_FILE, 'w') as f:
                 json.dump(settings, f, indent=2)
@@ -310,6 +382,19 @@ class CreateCustomIniGUI:
         except Exception as e:
             messagebox.showerror("Error", f"Could not save settings: {e}")
     
+    def save_detected_ini_folder(self):
+        """Remember the detected directory in the settings file, keeping everything else"""
+        try:
+            settings = {}
+            if os.path.exists(SETTINGS_FILE):
+                with open(SETTINGS_FILE, 'r') as f:
+                    settings = json.load(f)
+            settings['detected_ini_folder'] = self.detected_ini_folder
+            with open(SETTINGS_FILE, 'w') as f:
+                json.dump(settings, f, indent=2)
+        except Exception as e:
+            print(f"Could not save detected directory: {e}")
+    
     def apply_theme(self):
         """Apply dark or light theme"""
         style = ttk.Style()
@@ -341,69 +426,153 @@ class CreateCustomIniGUI:
             self.output_text.configure(bg='white', fg='black', insertbackground='black')
     
     def scan_mods(self):
-        """Scan for mods and update preview"""
-        thread = threading.Thread(target=self._scan_mods_thread, daemon=True)
+        """Scan for mods and update preview, cancelling a scan that is still running"""
+        self.scan_cancel.set()
+        self.scan_cancel = threading.Event()
+        thread = threading.Thread(target=self._scan_mods_thread,
+                                  args=(self.data_folder.get(), self.scan_cancel), daemon=True)
         thread.start()
     
-    def _scan_mods_thread(self):
-        """Thread worker for scanning mods"""
+    def _scan_mods_thread(self, mods_dir, cancel):
+        """Thread worker for scanning mods, hands the result to the main loop"""
+        def progress(seen, found):
+            self.scan_results.put((f"Scanning... {found} mods in {seen} files", None))
+        
         try:
-            mods_dir = self.data_folder.get()
-            
             if not os.path.exists(mods_dir):
-                self.mod_count.set("Mods found: 0 (Invalid path)")
+                self.scan_results.put(("Mods found: 0 (Invalid path)", None))
                 return
             
-            # Reset found_mods
-            for resource in RESOURCE_MAP:
-                resource["found_mods"] = []
+            scan, _ = self.get_scan(mods_dir, cancel=cancel, progress=progress)
+            classification = classify_mods(scan.archives)
             
-            total_mods = 0
-            
-            # Scan for mods
-            for _, _, filenames in os.walk(mods_dir):
-                for file in filenames:
-                    if not file.startswith("SeventySix") and file.lower().endswith(".ba2"):
-                        total_mods += 1
-                        found = False
-                        for resource in RESOURCE_MAP:
-                            if file in resource["mods"]:
-                                resource["found_mods"].append(file)
-                                found = True
-                                break
-                        if not found:
-                            RESOURCE_MAP[SR_2LIST_INDEX]["found_mods"].append(file)
-                break
-            
-            self.mod_count.set(f"Mods found: {total_mods}")
-            self.update_mod_tree()
+            # A newer scan owns the preview now
+            if not cancel.is_set():
+                self.scan_results.put((f"Mods found: {classification.total}", classification))
             
+        except ScanCancelled:
+            pass
         except Exception as e:
-            self.mod_count.set(f"Error scanning: {e}")
+            self.scan_results.put((f"Error scanning: {e}", None))
     
-    def update_mod_tree(self):
-        """Update the mod tree view with found mods"""
-        # Clear existing items
-        for item in self.mod_tree.get_children():
-            self.mod_tree.delete(item)
-        
-        # Add sections and mods
-        for resource in RESOURCE_MAP:
-            if resource["found_mods"]:
-                section_name = resource["filename"]
-                count = len(resource["found_mods"])
-                parent = self.mod_tree.insert('', 'end', text=section_name, values=(count,), open=True)
-                
-                # Sort mods for display
-                sorted_mods = sorted(resource["found_mods"])
-                for mod in sorted_mods:
-                    self.mod_tree.insert(parent, 'end', text=f"  {mod}", values=('',))
+    def get_scan(self, mods_dir, trace=NULL_TRACE, cancel=None, progress=None):
+        """
+        Scan mods_dir, or reuse the last scan of it while it is still current.
+        Returns (scan, reused). Safe to call from worker threads, a cancelled
+        scan raises ScanCancelled and is not cached.
+        """
+        key = os.path.abspath(mods_dir)
+        scan = self.scan_cache.get(key)
+        if scan is not None and scan_is_current(scan):
+            return scan, True
+        scan = scan_data_folder(mods_dir, trace, cancel, progress)
+        self.scan_cache[key] = scan
+        return scan, False
+    
+    def _poll_scan_results(self):
+        """Apply the latest queued scan on the main thread, older ones are superseded"""
+        latest = None
+        try:
+            while True:
+                latest = self.scan_results.get_nowait()
+        except queue.Empty:
+            pass
+        if latest is not None:
+            status, classification = latest
+            self.mod_count.set(status)
+            if classification is not None:
+                self.update_mod_tree(classification)
+        self.root.after(SCAN_POLL_MS, self._poll_scan_results)
+    
+    def update_mod_tree(self, classification):
+        """
+        Update the mod tree view with found mods. Runs on the main thread.
+        Sections and rows that are already shown are kept, only added and
+        removed mods touch the tree, and the rows are inserted in time slices.
+        """
+        tree = self.mod_tree
+        self.tree_jobs.clear()
+        
+        sections = [section for section in classification.sections if section.found_mods]
+        wanted = {section.filename for section in sections}
+        for filename in list(self.tree_wanted):
+            if filename not in wanted:
+                tree.delete(filename)
+                del self.tree_wanted[filename]
+                self.tree_shown.pop(filename, None)
+        
+        for index, section in enumerate(sections):
+            filename = section.filename
+            mods = sorted(section.found_mods)
+            self.tree_wanted[filename] = mods
+            if tree.exists(filename):
+                tree.move(filename, '', index)
+                tree.item(filename, values=(len(mods),))
+            elif len(mods) <= LAZY_SECTION_ROWS:
+                tree.insert('', index, iid=filename, text=filename, values=(len(mods),), open=True)
+                self.tree_shown[filename] = set()
+            else:
+                tree.insert('', index, iid=filename, text=filename, values=(len(mods),))
+                # Placeholder so the section can be expanded
+                tree.insert(filename, 'end', iid=f"{filename}/", text="  Loading...", values=('',))
+            if filename in self.tree_shown:
+                self.tree_jobs.append(self._fill_section(filename))
+        self._schedule_tree_jobs()
+    
+    def on_section_open(self, event):
+        """Fill a collapsed section the first time it is expanded"""
+        filename = self.mod_tree.focus()
+        if filename in self.tree_wanted and filename not in self.tree_shown:
+            self.mod_tree.delete(f"{filename}/")
+            self.tree_shown[filename] = set()
+            self.tree_jobs.append(self._fill_section(filename))
+            self._schedule_tree_jobs()
+    
+    def _fill_section(self, filename):
+        """
+        Bring the rows of a section in line with tree_wanted, yielding after
+        every inserted row. Rows are kept in sorted order, so inserting the
+        missing mods in order puts each one at its final index.
+        """
+        tree = self.mod_tree
+        mods = self.tree_wanted[filename]
+        shown = self.tree_shown[filename]
+        
+        removed = shown.difference(mods)
+        if removed:
+            tree.delete(*(f"{filename}/{mod}" for mod in removed))
+            shown -= removed
+        
+        for index, mod in enumerate(mods):
+            if mod not in shown:
+                tree.insert(filename, index, iid=f"{filename}/{mod}", text=f"  {mod}", values=('',))
+                shown.add(mod)
+                yield
+    
+    def _schedule_tree_jobs(self):
+        if self.tree_jobs and self.tree_after is None:
+            self.tree_after = self.root.after(0, self._run_tree_jobs)
+    
+    def _run_tree_jobs(self):
+        """Work through queued row updates until the time slice is used up"""
+        self.tree_after = None
+        deadline = time.perf_counter() + TREE_SLICE_SECONDS
+        while self.tree_jobs and time.perf_counter() < deadline:
+            try:
+                next(self.tree_jobs[0])
+            except StopIteration:
+                self.tree_jobs.popleft()
+        if self.tree_jobs:
+            # after(1) instead of after_idle lets Tk redraw and handle input in between
+            self.tree_after = self.root.after(1, self._run_tree_jobs)
     
     def open_output_folder(self):
         """Open the output folder in file explorer"""
         if self.last_created_path:
             folder = os.path.dirname(self.last_created_path)
             if os.path.exists(folder):
+                import subprocess
+                
                 if sys.platform == 'win32':
                     os.startfile(folder)
                 elif sys.platform == 'darwin':
@@ -430,41 +599,95 @@ class CreateCustomIniGUI:
             self.import_ini.set(file)
             
     def log(self, message):
-        """Add message to output log"""
-        self.output_text.config(state='normal')
-        self.output_text.insert(tk.END, message + "\n")
-        self.output_text.see(tk.END)
-        self.output_text.config(state='disabled')
-        self.root.update_idletasks()
-        
-    def create_ini(self):
+        """Add message to output log, safe to call from any thread"""
+        self.log_sink.write(message)
+        
+    def toggle_watch(self):
+        """Start or stop regenerating the INI when mods change in the data folder"""
+        if self.watch_mods.get():
+            self.start_watch()
+        else:
+            self.stop_watch()
+            self.log("Stopped watching the data folder")
+    
+    def start_watch(self):
+        """Watch the data folder, regenerating the INI once a burst of changes settles"""
+        try:
+            from folderWatcher import FolderWatcher
+        except ImportError as e:
+            self.watch_mods.set(False)
+            messagebox.showerror(
+                "Error", f"Watching needs folderWatcher.py next to this script ({e})"
+            )
+            return
+        
+        mods_dir = self.data_folder.get()
+        if not os.path.isdir(mods_dir):
+            self.watch_mods.set(False)
+            messagebox.showerror("Error", f"Data folder '{mods_dir}' does not exist!")
+            return
+        self.watcher = FolderWatcher(mods_dir, self._on_mods_changed, accept=is_mod_archive)
+        self.watcher.start()
+        self.log(f"Watching {mods_dir} for mod changes")
+    
+    def stop_watch(self):
+        if self.watcher:
+            # Wake the watcher thread but don't wait for it on the Tk thread
+            self.watcher.stop(wait=False)
+            self.watcher = None
+    
+    def restart_watch(self, *args):
+        """Follow the data folder entry while watching, once typing pauses"""
+        if self.watch_restart is not None:
+            self.root.after_cancel(self.watch_restart)
+        self.watch_restart = self.root.after(WATCH_RESTART_MS, self._restart_watch)
+    
+    def _restart_watch(self):
+        self.watch_restart = None
+        if self.watch_mods.get():
+            self.stop_watch()
+            if os.path.isdir(self.data_folder.get()):
+                self.start_watch()
+    
+    def _on_mods_changed(self):
+        """Called on the watcher thread, hand the regeneration to the main loop"""
+        self.root.after(0, lambda: self.create_ini(notify=False))
+    
+    def create_ini(self, notify=True):
         """Create the custom INI file"""
+        # Disable button during processing
+        self.create_btn.config(state='disabled')
+        self.log_sink.clear()
+        
+        settings = (
+            self.data_folder.get(),
+            self.ini_folder.get() or self.detected_ini_folder,
+            self.ini_filename.get(),
+            self.import_ini.get(),
+            self.show_timings.get(),
+            self.update_in_place.get(),
+            notify,
+        )
         # Run in a separate thread to prevent GUI freezing
-        thread = threading.Thread(target=self._create_ini_thread, daemon=True)
+        thread = threading.Thread(target=self._create_ini_thread, args=settings, daemon=True)
         thread.start()
         
-    def _create_ini_thread(self):
-        """Thread worker for creating INI file"""
+    def _create_ini_thread(self, mods_dir, ini_folder, ini_filename, import_ini_path,
+                           show_timings, update_in_place, notify):
+        """Thread worker for creating INI file, widgets are only touched through root.after"""
+        ini_file_path = ini_filename
         try:
-            # Disable button during processing
-            self.create_btn.config(state='disabled')
-            
-            # Clear output
-            self.output_text.config(state='normal')
-            self.output_text.delete(1.0, tk.END)
-            self.output_text.config(state='disabled')
-            
-            mods_dir = self.data_folder.get()
-            ini_folder = self.ini_folder.get()
-            filename = self.ini_filename.get()
-            import_ini_path = self.import_ini.get()
-            
-            ini_file_path = os.path.join(ini_folder, filename)
+            # Detection may still be running when Create is clicked straight away,
+            # probe here instead of on the Tk thread
+            if not ini_folder:
+                ini_folder = find_fallout76_directory()
+            ini_file_path = os.path.join(ini_folder, ini_filename)
             
             # Validate data folder
             if not os.path.exists(mods_dir):
                 self.log(f"Error: Data folder '{mods_dir}' does not exist!")
-                messagebox.showerror("Error", f"Data folder '{mods_dir}' does not exist!")
+                self.root.after(0, self.show_message, 'showerror', "Error",
+                                f"Data folder '{mods_dir}' does not exist!")
                 return
                 
             # Create output folder if needed
@@ -473,92 +696,80 @@ class CreateCustomIniGUI:
             self.log(f"Scanning for mods in: {mods_dir}")
             self.log(f"Creating ini file at: {ini_file_path}")
             
-            # Reset found_mods for each resource
-            for resource in RESOURCE_MAP:
-                resource["found_mods"] = []
-            
-            # Scan for mods
-            for _, _, filenames in os.walk(mods_dir):
-                for file in filenames:
-                    if not file.startswith("SeventySix") and file.lower().endswith(".ba2"):
-                        found = False
-                        for resource in RESOURCE_MAP:
-                            if file in resource["mods"]:
-                                resource["found_mods"].append(file)
-                                found = True
-                                break
-                        if not found:
-                            RESOURCE_MAP[SR_2LIST_INDEX]["found_mods"].append(file)
-                break
+            trace = Trace() if show_timings else NULL_TRACE
+            with trace.phase("scan"):
+                scan, reused = self.get_scan(mods_dir, trace)
+            if reused:
+                self.log("Reusing the scan from Scan Mods, the data folder has not changed")
+            with trace.phase("classify"):
+                classification = classify_mods(scan.archives)
+            trace.record_classification(classification)
+            with trace.phase("render"):
+                content = render_ini(classification)
             
             # Write INI file
-            with open(ini_file_path, "w+", encoding="utf-8") as custom_ini_file:
-                custom_ini_file.write("[Archive]\r\n")
-                
-                for resource in RESOURCE_MAP:
-                    if resource["found_mods"]:
-                        found_mods = set(resource["found_mods"])
-                        mods = resource["mods"]
-                        mod_list = ", ".join(mod for mod in mods if mod in found_mods)
-                        
-                        diff_list = [item for item in found_mods if item not in mods]
-                        if diff_list:
-                            diff_list.sort()
-                            
-                            if MOD_TO_PLACE_LAST in diff_list:
-                                diff_list.remove(MOD_TO_PLACE_LAST)
-                                diff_list.append(MOD_TO_PLACE_LAST)
-                            
-                            diff_list = ", " + ", ".join(diff_list)
-                        else:
-                            diff_list = ""
-                        
-                        default_mods = ", ".join(resource["default_mods"])
-                        line_content = "{}{}".format(default_mods, mod_list + diff_list)
-                        
-                        if line_content.startswith(", "):
-                            line_content = line_content[2:]
-                        
-                        custom_ini_file.write(f"{resource['filename']} = {line_content}\r\n")
-                        self.log(f"Added {len(found_mods)} mods to {resource['filename']}")
-                
-                # Import additional INI contents
-                if import_ini_path and os.path.exists(import_ini_path):
-                    with open(import_ini_path, "r", encoding="utf-8") as import_file:
-                        custom_ini_file.write(import_file.read())
-                    self.log(f"Imported contents from: {import_ini_path}")
-                elif import_ini_path:
-                    self.log(f"Warning: Import file '{import_ini_path}' not found!")
+            with trace.phase("write"):
+                if update_in_place:
+                    if import_ini_path:
+                        self.log("Import INI is ignored when updating the existing INI in place")
+                    managed = [section.filename for section in classification.sections]
+                    result = update_ini(ini_file_path, content, managed)
+                else:
+                    result = write_ini(ini_file_path, content, import_ini_path)
+            trace.record_write(result)
             
-            self.log(f"\nSuccessfully created {ini_file_path}")
-            self.last_created_path = ini_file_path
-            self.open_folder_btn.config(state='normal')
+            for section in classification.sections:
+                if section.found_mods:
+                    self.log(f"Added {len(section.found_mods)} mods to {section.filename}")
             
-            # Switch to output log tab
-            self.notebook.select(1)
+            # Import additional INI contents
+            if result.imported:
+                self.log(f"Imported contents from: {import_ini_path}")
+            elif result.imported is False:
+                self.log(f"Warning: Import file '{import_ini_path}' not found!")
             
-            messagebox.showinfo("Success", f"Successfully created {ini_file_path}")
+            if result.changed:
+                verb = "updated" if update_in_place else "created"
+                self.log(f"\nSuccessfully {verb} {ini_file_path}")
+            else:
+                self.log(f"\n{ini_file_path} is already up to date, left it untouched")
+            if show_timings:
+                self.log("")
+                for line in trace.report():
+                    self.log(line)
+            self.root.after(0, self._ini_created, ini_file_path, notify)
             
         except PermissionError:
             error_msg = f"Permission denied writing to '{ini_file_path}'. Try running as administrator."
             self.log(f"Error: {error_msg}")
-            messagebox.showerror("Permission Error", error_msg)
+            self.root.after(0, self.show_message, 'showerror', "Permission Error", error_msg)
         except Exception as e:
             error_msg = f"Error creating ini file: {e}"
             self.log(f"Error: {error_msg}")
-            messagebox.showerror("Error", error_msg)
+            self.root.after(0, self.show_message, 'showerror', "Error", error_msg)
         finally:
             # Re-enable button
-            self.create_btn.config(state='normal')
+            self.root.after(0, lambda: self.create_btn.config(state='normal'))
+    
+    def _ini_created(self, ini_file_path, notify):
+        self.last_created_path = ini_file_path
+        self.open_folder_btn.config(state='normal')
+        
+        # Switch to output log tab
+        self.notebook.select(1)
+        
+        if notify:
+            self.show_message('showinfo', "Success", f"Successfully created {ini_file_path}")
+    
+    def show_message(self, kind, title, message):
+        """Show a messagebox once the log behind it is on screen. Main thread only."""
+        self.log_sink.flush()
+        getattr(messagebox, kind)(title, message)
 
 
 def main():
-    try:
-        # Try to use TkinterDnD for drag and drop support
-        root = TkinterDnD.Tk()
-    except:
-        # Fall back to regular Tk if TkinterDnD is not available
-        root = tk.Tk()
+    # Drag and drop support is loaded into this root once the window is up
+    root = tk.Tk()
     
     app = CreateCustomIniGUI(root)
     root.mainloop()
@@ -0,0 +1,89 @@
+"""
+This module writes files atomically and keeps the marshal caches for
+createCustomIni and its helper modules
+
+It has no dependencies of its own, so the engine and the modules it uses
+(ba2Archive, archiveHashes) can all import it without importing each other.
+"""
+
+import marshal
+import os
+import shutil
+import tempfile
+
+
+def file_matches(path, chunks):
+    """
+    Check whether the file at path already holds exactly the bytes in chunks,
+    an iterable of bytes. Both sides are read as a stream and the comparison
+    stops at the first difference.
+    """
+    try:
+        with open(path, "rb") as f:
+            for chunk in chunks:
+                if f.read(len(chunk)) != chunk:
+                    return False
+            return f.read(1) == b""
+    except OSError:
+        return False
+
+
+def replace_file(path, chunks):
+    """
+    Write chunks (an iterable of bytes) to a temp file in the same folder and
+    swap it in with os.replace, so readers (and OneDrive) never see a half
+    written file. Returns the number of bytes written.
+    """
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(
+        prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=folder
+    )
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            # mkstemp creates 0600 files, use what open() would have created
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def load_cache(cache_file, version):
+    """
+    Read a marshal cache written by save_cache(). Returns its state dict, or
+    None when the file is missing, unreadable or from another version.
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            state = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(state, dict) or state.get("version") != version:
+        return None
+    return state
+
+
+def save_cache(cache_file, state):
+    """
+    Replace cache_file with state, a dict of plain data with a "version".
+    Caches are only an optimisation, a read-only install just goes without.
+    """
+    try:
+        replace_file(cache_file, [marshal.dumps(state)])
+    except OSError:
+        pass
@@ -0,0 +1,245 @@
+"""
+This module watches a data folder for added, removed or renamed mod archives
+
+inotify is used on Linux, everywhere else the folder's mtime is polled, which
+is a single stat per interval. Changes are debounced so a mod manager
+deploying a batch of archives triggers one callback instead of one per file.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify_event: wd, mask, cookie, len, followed by the name
+INOTIFY_EVENT = struct.Struct("iIII")
+# IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+IN_MODIFY_DIR = 0x00000100 | 0x00000200 | 0x00000040 | 0x00000080
+# IN_DELETE_SELF | IN_MOVE_SELF
+IN_SELF_GONE = 0x00000400 | 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class _InotifyBackend:
+    """
+    Reports the names that changed in a folder through Linux inotify.
+    gone is set once the folder itself was deleted or moved away, the watch
+    is dead from then on.
+    """
+
+    gone = False
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(
+            self.fd, os.fsencode(folder), IN_MODIFY_DIR | IN_SELF_GONE
+        )
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+        # wake() writes to this pipe to end a wait() early
+        self.wake_read, self.wake_write = os.pipe()
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds. Returns the changed names, None for
+        "something changed, rescan" and an empty list when nothing happened.
+        """
+        readable, _, _ = select.select([self.fd, self.wake_read], [], [], timeout)
+        if self.fd not in readable:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_SELF_GONE:
+                self.gone = True
+                return None
+            if mask & IN_Q_OVERFLOW:
+                return None
+            names.append(os.fsdecode(name))
+        return names
+
+    def wake(self):
+        os.write(self.wake_write, b"\0")
+
+    def close(self):
+        os.close(self.fd)
+        os.close(self.wake_read)
+        os.close(self.wake_write)
+
+
+class _PollingBackend:
+    """
+    Reports changes by polling the folder's mtime, which moves whenever an
+    entry is added, removed or renamed. Only then is the folder listed.
+    A folder that is missing for a while is picked up again when it returns.
+    """
+
+    gone = False
+
+    def __init__(self, folder, interval):
+        self.folder = folder
+        self.interval = interval
+        self.woken = threading.Event()
+        self.mtime = self._mtime()
+        self.names = self._names()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _names(self):
+        try:
+            with os.scandir(self.folder) as entries:
+                return {entry.name for entry in entries}
+        except OSError:
+            return set()
+
+    def wait(self, timeout):
+        if self.woken.wait(min(timeout, self.interval)):
+            return []
+        mtime = self._mtime()
+        if mtime == self.mtime:
+            return []
+        self.mtime = mtime
+        names = self._names()
+        changed = list(names ^ self.names)
+        self.names = names
+        return changed
+
+    def wake(self):
+        self.woken.set()
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """
+    Calls callback() once a burst of relevant changes in folder has settled.
+    A change is relevant when accept(name) is true for the file that was
+    added, removed or renamed. Callbacks run on the watcher thread.
+    """
+
+    def __init__(
+        self,
+        folder,
+        callback,
+        accept=None,
+        debounce=2.0,
+        max_delay=30.0,
+        poll_interval=1.0,
+        use_inotify=True,
+    ):
+        self.folder = folder
+        self.callback = callback
+        self.accept = accept or (lambda name: True)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self._stop = threading.Event()
+        self._thread = None
+        # The backend of the running watch, woken by stop(); the lock keeps
+        # stop() from waking a backend that is being closed
+        self._active = None
+        self._lock = threading.Lock()
+
+    def _backend(self):
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                return _InotifyBackend(self.folder)
+            except (OSError, AttributeError, TypeError):
+                # No usable inotify (old libc, sandbox, too many watches)
+                pass
+        return _PollingBackend(self.folder, self.poll_interval)
+
+    def _relevant(self, names):
+        return names is None or any(self.accept(name) for name in names)
+
+    def run(self):
+        """
+        Watch until stop() is called, blocking the calling thread.
+        """
+        backend = self._backend()
+        with self._lock:
+            self._active = backend
+        try:
+            pending_since = None
+            last_change = None
+            while not self._stop.is_set():
+                if pending_since is None:
+                    timeout = self.poll_interval
+                else:
+                    due = min(
+                        last_change + self.debounce, pending_since + self.max_delay
+                    )
+                    timeout = max(0.0, due - time.monotonic())
+                names = backend.wait(timeout)
+                if backend.gone:
+                    # Watch whatever is at the path now, a missing folder is
+                    # polled until it comes back
+                    with self._lock:
+                        backend.close()
+                        backend = self._active = self._backend()
+                now = time.monotonic()
+                if self._relevant(names):
+                    last_change = now
+                    if pending_since is None:
+                        pending_since = now
+                if pending_since is not None and (
+                    now - last_change >= self.debounce
+                    or now - pending_since >= self.max_delay
+                ):
+                    pending_since = None
+                    self.callback()
+        finally:
+            with self._lock:
+                self._active = None
+                backend.close()
+
+    def start(self):
+        """
+        Watch on a daemon thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop watching. The watcher thread is woken rather than left to finish
+        its current wait; with wait=False it is not joined either, for
+        callers (like a UI thread) that must not block on a running callback.
+        """
+        self._stop.set()
+        with self._lock:
+            if self._active is not None:
+                self._active.wake()
+        if (
+            wait
+            and self._thread is not None
+            and self._thread is not threading.current_thread()
+        ):
+            self._thread.join()
+        self._thread = None
@@ -0,0 +1,284 @@
+"""
+This module serves createCustomIni over JSON-RPC on localhost (--serve)
+
+Mod managers that regenerate the ini after every install can keep one
+process running instead of paying for interpreter startup, directory
+detection and catalog loading on each call. The compiled catalog and the
+last scan of each data folder stay in memory between requests and are
+re-checked with a few stats before they are reused.
+
+    POST http://127.0.0.1:7676/<token>/
+    {"jsonrpc": "2.0", "id": 1, "method": "generate", "params": {}}
+
+The token is made up for each run and printed on the "Serving on" line, so
+only the process that started the server (and read its output) can call
+it. Requests for another Host are refused, which stops web pages that
+rebind their own domain to 127.0.0.1.
+
+Methods (all parameters optional, they default to the --serve arguments):
+    scan(data_dir)                                   archives found
+    preview(data_dir)                                mods per ini section
+    generate(data_dir, ini_file, import_ini, update) write the ini
+    shutdown()                                       stop the server
+"""
+
+import hmac
+import inspect
+import json
+import os
+import secrets
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import createCustomIni
+
+DEFAULT_PORT = 7676
+HOST = "127.0.0.1"
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class RpcError(Exception):
+    """
+    Raised by a method to answer with a JSON-RPC error.
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class IniService:
+    """
+    The methods served over JSON-RPC, with the catalog and the last scan of
+    each data folder kept warm. The server handles one request at a time,
+    so the caches need no locking.
+    """
+
+    def __init__(self, mods_dir, ini_file_path, catalog_paths, walk=None):
+        self.mods_dir = mods_dir
+        self.ini_file_path = ini_file_path
+        self.catalog_paths = catalog_paths
+        self.walk = walk
+        self._catalog = None
+        self._scans = {}
+        self.server = None
+
+    def catalog(self):
+        """
+        The compiled catalog, reloaded only when one of its files changed.
+        """
+        try:
+            key = createCustomIni._catalog_cache_key(self.catalog_paths)
+            if self._catalog is None or self._catalog.key != key:
+                self._catalog = createCustomIni.load_catalog(self.catalog_paths)
+        except createCustomIni.CatalogError as e:
+            raise RpcError(SERVER_ERROR, f"Error loading mod catalog: {e}")
+        return self._catalog
+
+    def scan(self, data_dir=None):
+        """
+        Scan a data folder, reusing the last scan of it while it is current.
+        Subfolders are scanned too when the server runs with --recursive.
+        """
+        data_dir = data_dir or self.mods_dir
+        key = os.path.abspath(data_dir)
+        scan = self._scans.get(key)
+        if scan is None or not createCustomIni.scan_is_current(scan):
+            try:
+                scan = createCustomIni.scan_data_folder(data_dir, walk=self.walk)
+            except FileNotFoundError as e:
+                raise RpcError(SERVER_ERROR, str(e))
+            self._scans[key] = scan
+        return scan
+
+    def rpc_scan(self, data_dir=None):
+        scan = self.scan(data_dir)
+        return {
+            "data_dir": os.path.abspath(scan.data_dir),
+            "archives": list(scan.archives),
+        }
+
+    def rpc_preview(self, data_dir=None):
+        classification = createCustomIni.classify_mods(
+            self.scan(data_dir).archives, self.catalog().classifier
+        )
+        return {
+            "total": classification.total,
+            "sections": [
+                {"filename": section.filename, "mods": sorted(section.found_mods)}
+                for section in classification.sections
+                if section.found_mods
+            ],
+        }
+
+    def rpc_generate(self, data_dir=None, ini_file=None, import_ini=None, update=False):
+        ini_file = ini_file or self.ini_file_path
+        if update and import_ini:
+            raise RpcError(INVALID_PARAMS, "update can't be combined with import_ini")
+        classification = createCustomIni.classify_mods(
+            self.scan(data_dir).archives, self.catalog().classifier
+        )
+        content = createCustomIni.render_ini(classification)
+        try:
+            if update:
+                managed = [section.filename for section in classification.sections]
+                write = createCustomIni.update_ini(ini_file, content, managed)
+            else:
+                write = createCustomIni.write_ini(ini_file, content, import_ini)
+        except OSError as e:
+            raise RpcError(SERVER_ERROR, f"Error creating ini file: {e}")
+        return {
+            "path": write.path,
+            "changed": write.changed,
+            "bytes_written": write.bytes_written,
+            "imported": write.imported,
+            "total": classification.total,
+        }
+
+    def rpc_shutdown(self):
+        # shutdown() waits for serve_forever(), which is busy with this request
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return True
+
+    def dispatch(self, request):
+        """
+        Answer one JSON-RPC request object. Returns None for notifications.
+        """
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        method = getattr(self, "rpc_" + request["method"], None)
+        params = request.get("params", {})
+        try:
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"Unknown method {request['method']}")
+            if isinstance(params, dict):
+                args, kwargs = (), params
+            elif isinstance(params, list):
+                args, kwargs = params, {}
+            else:
+                raise RpcError(INVALID_PARAMS, "params must be an object or an array")
+            try:
+                inspect.signature(method).bind(*args, **kwargs)
+            except TypeError as e:
+                raise RpcError(INVALID_PARAMS, str(e))
+            result = method(*args, **kwargs)
+        except RpcError as e:
+            response = _error(request_id, e.code, e.message)
+        except Exception as e:
+            # Keep serving, a failed request must not take the server down
+            response = _error(request_id, SERVER_ERROR, f"{type(e).__name__}: {e}")
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        return response if "id" in request else None
+
+
+def _error(request_id, code, message):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        # Browsers can't send application/json to another origin without a
+        # CORS preflight, which is never answered, so web pages can't call us
+        if self.headers.get("Content-Type", "").split(";")[0] != "application/json":
+            self.send_error(415, "Content-Type must be application/json")
+            return
+        # DNS rebinding reaches us with the attacker's host name in Host
+        port = self.server.server_address[1]
+        if self.headers.get("Host") not in (f"{HOST}:{port}", f"localhost:{port}"):
+            self.send_error(403, "Unexpected Host header")
+            return
+        if not hmac.compare_digest(self.path.encode(), self.server.path.encode()):
+            self.send_error(403, "Missing or wrong token")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError:
+            response = _error(None, PARSE_ERROR, "Parse error")
+        else:
+            service = self.server.service
+            if isinstance(request, list) and request:
+                responses = [service.dispatch(item) for item in request]
+                response = [item for item in responses if item is not None] or None
+            else:
+                response = service.dispatch(request)
+
+        body = json.dumps(response).encode("utf-8") if response is not None else b""
+        self.send_response(200 if body else 204)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # One line per request would drown the console of a busy mod manager
+        pass
+
+
+def serve(
+    mods_dir, ini_file_path, catalog_paths, port=DEFAULT_PORT, log=print, walk=None
+):
+    """
+    Serve the JSON-RPC methods on 127.0.0.1:port until shutdown() is called
+    or the process is interrupted. Port 0 picks a free port. The address,
+    with this run's token as its path, is logged either way. walk (a
+    WalkOptions) makes every scan include subfolders.
+    Returns the process exit code.
+    """
+    service = IniService(mods_dir, ini_file_path, catalog_paths, walk)
+    try:
+        # Load the catalog now so the first request is already fast
+        service.catalog()
+    except RpcError as e:
+        log(e.message)
+        return 1
+
+    try:
+        server = HTTPServer((HOST, port), _Handler)
+    except OSError as e:
+        log(f"Error: Could not listen on {HOST}:{port}: {e}")
+        return 1
+    server.service = service
+    server.path = f"/{secrets.token_urlsafe(16)}/"
+    service.server = server
+    log(f"Serving on http://{HOST}:{server.server_address[1]}{server.path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def call(url, method, params=None, timeout=30):
+    """
+    Call a method on a running server, at the url it printed on its
+    "Serving on" line, and return its result. Raises RpcError when the
+    server answers with an error.
+    """
+    request = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}}
+    http_request = urllib.request.Request(
+        url,
+        data=json.dumps(request).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(http_request, timeout=timeout) as response:
+        reply = json.loads(response.read())
+    if "error" in reply:
+        raise RpcError(reply["error"]["code"], reply["error"]["message"])
+    return reply["result"]